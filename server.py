@@ -1,22 +1,57 @@
+import atexit
+import copy
 import logging
+import mimetypes
 import os
 import queue
 import re
+import sqlite3
 import subprocess  # For manual_combine
 import tempfile
 import threading
 import time
-import traceback  # For detailed error logging
 import uuid
-from contextlib import suppress
-from threading import Timer
-from urllib.parse import quote
-
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext, suppress
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from urllib.parse import parse_qs, quote, urlparse
+
+import orjson
 import yt_dlp
-from flask import Flask, jsonify, render_template, request, send_from_directory
+from flask import Flask, jsonify, render_template, request, send_file
+from flask.json.provider import DefaultJSONProvider
+from flask_compress import Compress
 from flask_cors import CORS
 
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (much faster for large /extract format lists)"""
+
+    def _dumps_bytes(self, obj) -> bytes:
+        # Fall back to Flask's default() for types orjson doesn't handle natively
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+
+    def dumps(self, obj, **kwargs):
+        return self._dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response (jsonify) instead of decoding to str and re-encoding
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps_bytes(obj), mimetype=self.mimetype)
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
+
+# Compress JSON responses (the /extract format list is large and highly repetitive); media files are left alone
+app.config["COMPRESS_MIMETYPES"] = ["application/json"]
+app.config["COMPRESS_LEVEL"] = 6
+Compress(app)
 
 # --- PO Token / bgutil Configuration ---
 # BGUTIL_BASE_URL: URL of the bgutil-ytdlp-pot-provider server for PO token generation
@@ -24,6 +59,14 @@ app = Flask(__name__)
 # - Docker: Set to http://bgutil:4416 via docker-compose.yml environment
 BGUTIL_BASE_URL = os.environ.get("BGUTIL_BASE_URL", "http://127.0.0.1:4416")
 
+# YTDLP_CACHE_DIR: yt-dlp's on-disk cache (deciphered player JS / signature functions)
+# - Shared by every yt-dlp call so the player script is fetched and parsed once, not per request
+YTDLP_CACHE_DIR = os.environ.get("YTDLP_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ytdlp-cache"))
+
+# YTDLP_CONCURRENT_FRAGMENTS: fragments yt-dlp fetches in parallel for DASH/HLS formats
+# - YouTube throttles per connection, so several connections per stream raise throughput; 1 disables it
+YTDLP_CONCURRENT_FRAGMENTS = max(1, int(os.environ.get("YTDLP_CONCURRENT_FRAGMENTS", "4")))
+
 
 def get_ytdlp_base_opts():
     """
@@ -35,6 +78,8 @@ def get_ytdlp_base_opts():
     - Configuring the bgutil plugin to fetch PO tokens from the bgutil server
     """
     return {
+        "cachedir": YTDLP_CACHE_DIR,  # Reuse deciphered player JS across calls
+        "concurrent_fragment_downloads": YTDLP_CONCURRENT_FRAGMENTS,  # Parallel fragment fetches (DASH/HLS)
         "js_runtimes": {"node": {}},  # Enable Node.js for JS challenge solving
         "extractor_args": {
             "youtube": {"player_client": ["mweb"]},
@@ -70,30 +115,280 @@ if __name__ != "__main__":
     app.logger.setLevel(gunicorn_logger.level)
     # app.logger.propagate = False (set earlier) ensures these messages don't also go to root logger.
 
+# Emit records from a background listener thread, so request and worker threads only enqueue them
+# instead of contending for the stream handler's lock and blocking on stderr writes
+if app.logger.handlers:
+    _log_queue = queue.SimpleQueue()
+    _log_listener = QueueListener(_log_queue, *app.logger.handlers, respect_handler_level=True)
+    app.logger.handlers = [QueueHandler(_log_queue)]
+    _log_listener.start()
+    atexit.register(_log_listener.stop)  # Flush queued records on shutdown
+
 # Ensure PROCESSED_FILES_DIR exists when module loads
 PROCESSED_FILES_DIR = os.path.join(os.getcwd(), "processed_files")  # Define PROCESSED_FILES_DIR before using it
 if not os.path.exists(PROCESSED_FILES_DIR):
-    print(f"Creating processed files directory: {PROCESSED_FILES_DIR}", flush=True)
-    os.makedirs(PROCESSED_FILES_DIR)
+    app.logger.info(f"Creating processed files directory: {PROCESSED_FILES_DIR}")
+    os.makedirs(PROCESSED_FILES_DIR, exist_ok=True)
 
 app.logger.info("Flask logger initialized.")
 
+
+class TaskStore:
+    """Thread-safe task_id -> status dict map, lock-striped so concurrent progress hooks don't share one lock"""
+
+    def __init__(self, shard_count: int = 16, max_tasks: int = 0):
+        self._shards = [({}, threading.Lock()) for _ in range(shard_count)]
+        # 0 = unbounded; otherwise each shard keeps its share of max_tasks between cleanup_old_tasks sweeps
+        self._max_per_shard = -(-max_tasks // shard_count) if max_tasks else 0
+
+    def _shard(self, task_id: str) -> tuple[dict, threading.Lock]:
+        return self._shards[hash(task_id) % len(self._shards)]
+
+    def _evict_if_full(self, data: dict) -> None:
+        """Drop the oldest finished task from a full shard (caller holds the shard lock)"""
+        if not self._max_per_shard or len(data) <= self._max_per_shard:
+            return
+        # Dicts keep insertion order, so the first finished entry is the oldest; active tasks are never evicted
+        for task_id, status in data.items():
+            if status.get("completed_at"):
+                del data[task_id]
+                return
+
+    def get(self, task_id: str, default=None):
+        data, lock = self._shard(task_id)
+        with lock:
+            return data.get(task_id, default)
+
+    def __getitem__(self, task_id: str) -> dict:
+        data, lock = self._shard(task_id)
+        with lock:
+            return data[task_id]
+
+    def __setitem__(self, task_id: str, status: dict) -> None:
+        data, lock = self._shard(task_id)
+        with lock:
+            data[task_id] = status
+            self._evict_if_full(data)
+
+    def __contains__(self, task_id: str) -> bool:
+        data, lock = self._shard(task_id)
+        with lock:
+            return task_id in data
+
+    def __len__(self) -> int:
+        return sum(len(data) for data, _ in self._shards)
+
+    def pop(self, task_id: str, default=None):
+        data, lock = self._shard(task_id)
+        with lock:
+            return data.pop(task_id, default)
+
+    def update(self, task_id: str, patch: dict, derive=None) -> dict:
+        """Merge patch into task_id's status in one locked step and return the merged status
+
+        derive, if given, maps the merged status to extra fields. It runs under the shard lock, so a field computed
+        from others can't be based on a value a concurrent writer has already replaced.
+        """
+        data, lock = self._shard(task_id)
+        with lock:
+            # Build a new dict rather than mutating in place, so readers never see a half-applied update
+            status = {**data.get(task_id, {}), **patch}
+            if derive is not None:
+                status.update(derive(status))
+            data[task_id] = status
+            self._evict_if_full(data)
+        return status
+
+    def items(self) -> list[tuple[str, dict]]:
+        """Snapshot of all (task_id, status) pairs, safe to iterate while other threads write"""
+        snapshot = []
+        for data, lock in self._shards:
+            with lock:
+                snapshot.extend(data.items())
+        return snapshot
+
+
 # --- Task Queue Setup ---
-task_queue = queue.Queue()
-task_statuses = {}  # Stores status and result (e.g., filename or error)
-COMPLETED_TASKS = {}  # Stores the final state of tasks (completed or failed) for persistent lookup
-cancelled_tasks = set()  # Track task IDs that should be cancelled
+# Shared by all workers, so an idle worker always takes the next task; bounded so a submission burst
+# gets 503s instead of growing memory without limit
+MAX_QUEUE = max(1, int(os.environ.get("MAX_QUEUE", "50")))
+task_queue = queue.Queue(maxsize=MAX_QUEUE)
+DL_WORKERS = max(1, int(os.environ.get("DL_WORKERS", "2")))  # Tasks (download + FFmpeg) processed concurrently
+# Task records kept in memory at most; past this the oldest finished tasks are dropped before the daily sweep
+MAX_TASKS = max(0, int(os.environ.get("MAX_TASKS", "1024")))
+task_statuses = TaskStore(max_tasks=MAX_TASKS)  # Stores status and result (e.g., filename or error)
+# Per-task cancellation flags: /cancel_task sets the Event, hot paths poll is_set() without a lock or hash lookup
+task_events: dict[str, threading.Event] = {}
+# Progress hooks write status at most this often per (task_id, phase); parallel streams each get their own slot
+PROGRESS_UPDATE_INTERVAL_SECONDS = 0.2
+_last_progress_update = {}  # (task_id, phase) -> time.monotonic() of the last status write
+_status_json_cache = {}  # task_id -> (status dict, its JSON body, ETag) for repeated /task_status polls between changes
+# (task type, clean URL, format IDs...) -> task_id, so a repeated identical request reuses the existing task
+_task_dedupe_index: dict[tuple, str] = {}
+_task_dedupe_lock = threading.Lock()  # Held across lookup and enqueue so concurrent duplicates can't both queue
+# task_id -> ids of the clients sharing a still-running task (see _requester_id); guarded by _task_dedupe_lock.
+# /cancel_task only stops the task when its last requester cancels, so one user can't cancel another's download
+_task_requesters: dict[str, set[str]] = {}
+# task_id -> clients that cancelled a task still running for others; their /task_status polls report "cancelled"
+_task_withdrawn: dict[str, set[str]] = {}
+# Heavy work (downloads, FFmpeg) runs only on the worker threads and this small pool, never on request threads
+# Two slots per worker: each manual combine downloads its video and audio streams in parallel
+stream_download_executor = ThreadPoolExecutor(max_workers=2 * DL_WORKERS, thread_name_prefix="stream-dl")
 PROCESSED_FILES_DIR = os.path.join(os.getcwd(), "processed_files")
 # --- End Task Queue Setup ---
 
+# --- Task Persistence Setup ---
+# Completed task records are written through to SQLite so download links keep working across restarts.
+# The default location is a dotfile in PROCESSED_FILES_DIR (already a mounted volume in Docker), which the
+# processed-files index skips; set TASK_DB_PATH to "" to keep task records in memory only.
+TASK_DB_PATH = os.environ.get("TASK_DB_PATH", os.path.join(PROCESSED_FILES_DIR, ".tasks.sqlite3"))
+_task_db = None
+_task_db_lock = threading.Lock()  # One shared connection; sqlite3 connections must not be used concurrently
+if TASK_DB_PATH:
+    try:
+        _task_db = sqlite3.connect(TASK_DB_PATH, check_same_thread=False, isolation_level=None)
+        _task_db.execute("PRAGMA journal_mode=WAL")
+        _task_db.execute("PRAGMA synchronous=NORMAL")  # Durable enough for a cache of finished tasks
+        _task_db.execute(
+            "CREATE TABLE IF NOT EXISTS tasks (id TEXT PRIMARY KEY, status_json BLOB NOT NULL, completed_at REAL)"
+        )
+        atexit.register(_task_db.close)
+    except sqlite3.Error as e:
+        app.logger.warning(f"⚠️ Could not open task database {TASK_DB_PATH} ({e}), keeping task records in memory")
+        _task_db = None
 
+
+def _persist_completed_task(task_id: str, status_info: dict) -> None:
+    """Write a completed task's status to the task database (no-op when persistence is off)"""
+    if _task_db is None:
+        return
+    try:
+        with _task_db_lock:
+            _task_db.execute(
+                "INSERT OR REPLACE INTO tasks (id, status_json, completed_at) VALUES (?, ?, ?)",
+                (task_id, orjson.dumps(status_info), status_info.get("completed_at", time.time())),
+            )
+    except sqlite3.Error as e:
+        app.logger.warning(f"⚠️ Task {task_id}: could not persist completed status: {e}")
+
+
+def _load_persisted_tasks(max_age_hours: int = 24) -> None:
+    """Restore completed tasks from the task database whose files are still on disk"""
+    if _task_db is None:
+        return
+    cutoff_time = time.time() - (max_age_hours * 3600)
+    try:
+        with _task_db_lock:
+            rows = _task_db.execute(
+                "SELECT id, status_json FROM tasks WHERE completed_at >= ? ORDER BY completed_at", (cutoff_time,)
+            ).fetchall()
+    except sqlite3.Error as e:
+        app.logger.warning(f"⚠️ Could not load persisted tasks: {e}")
+        return
+    restored_count = 0
+    for task_id, status_json in rows:
+        status_info = orjson.loads(status_json)
+        on_disk_filename = status_info.get("on_disk_filename")
+        if on_disk_filename and os.path.isfile(os.path.join(PROCESSED_FILES_DIR, on_disk_filename)):
+            task_statuses[task_id] = status_info
+            restored_count += 1
+    if restored_count:
+        app.logger.info(f"💾 Restored {restored_count} completed tasks from {TASK_DB_PATH}")
+
+
+def _delete_persisted_tasks_before(cutoff_time: float) -> None:
+    """Drop task database rows that completed before cutoff_time"""
+    if _task_db is None:
+        return
+    try:
+        with _task_db_lock:
+            _task_db.execute("DELETE FROM tasks WHERE completed_at < ?", (cutoff_time,))
+    except sqlite3.Error as e:
+        app.logger.warning(f"⚠️ Could not prune persisted tasks: {e}")
+
+
+# --- End Task Persistence Setup ---
+
+# yt-dlp protocols for HLS streams (audio-only HLS is delivered as m4a)
+HLS_PROTOCOLS = frozenset({"m3u8", "m3u8_native"})
+
+# Override MIME types that Python's mimetypes module gets wrong
+# (e.g., .m4a → audio/mp4a-latm instead of audio/mp4, which browsers flag as insecure)
+MIME_TYPE_OVERRIDES = {
+    ".m4a": "audio/mp4",
+    ".webm": "audio/webm",
+}
+
+# Optional nginx offload: when set to an `internal` location that aliases processed_files/ (e.g. /_internal/processed/),
+# downloads answer with X-Accel-Redirect and nginx streams the file, so no app thread is held for the transfer
+X_ACCEL_REDIRECT_PREFIX = os.environ.get("X_ACCEL_REDIRECT_PREFIX", "").rstrip("/")
+# A task's file never changes once written, so the downloading browser may reuse it for a day. Only that browser:
+# the task_id URL is the only credential, so shared proxies must not keep a copy
+PROCESSED_FILE_MAX_AGE_SECONDS = 86400
+
+# --- Metadata Cache Setup ---
+# yt-dlp extract_info results keyed by cleaned URL, so repeat lookups of the same video skip YouTube
+EXTRACT_CACHE_TTL_SECONDS = int(os.environ.get("EXTRACT_CACHE_TTL", 3600))  # 1 hour (format URLs expire after ~6h)
+_extract_cache = {}  # clean_url -> (cached_at, info, formats_by_id)
+_extract_cache_lock = threading.Lock()  # Guards _extract_cache and _extract_url_locks
+_extract_url_locks = {}  # clean_url -> threading.Lock held while that URL is being extracted
+_info_ydl_local = threading.local()  # Per-thread reusable YoutubeDL for metadata extraction
+# --- End Metadata Cache Setup ---
+
+# --- Processed Files Index ---
+# Files written to PROCESSED_FILES_DIR in creation order, so cleanup walks only the oldest entries
+# instead of stat()ing the whole directory
+PROCESSED_FILES_MAX_BYTES = int(float(os.environ.get("PROCESSED_FILES_MAX_GB", 0)) * 1024**3)  # 0 = no size cap
+_processed_files_index = OrderedDict()  # on-disk filename -> (created_at, size_bytes), oldest first
+_processed_files_lock = threading.Lock()
+# --- End Processed Files Index ---
+
+# Number of trailing FFmpeg stderr lines kept for error messages
+FFMPEG_STDERR_TAIL_LINES = 50
+# Niceness for FFmpeg combines, so long transcodes yield the CPU to request threads and other workers
+FFMPEG_NICE = 10
+# FFMPEG_TRANSCODE_JOBS: video transcodes allowed to run at once; downloads and stream-copy remuxes are not limited
+# - DL_WORKERS can then be raised for more overlapping downloads without more encoders than the CPU can feed
+# CPUs this process may run on (a container's cpuset, not the host total); sched_getaffinity is Linux-only
+_USABLE_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 2)
+FFMPEG_TRANSCODE_JOBS = max(1, int(os.environ.get("FFMPEG_TRANSCODE_JOBS", max(1, _USABLE_CPUS // 2))))
+_transcode_slots = threading.BoundedSemaphore(FFMPEG_TRANSCODE_JOBS)
+TRANSCODE_SLOT_POLL_SECONDS = 0.5  # How often a task waiting for a transcode slot checks whether it was cancelled
+# Encoder threads per libx264 transcode, so concurrent transcodes split the CPUs instead of each claiming all
+X264_THREADS = str(max(1, _USABLE_CPUS // FFMPEG_TRANSCODE_JOBS))
+
+# libx264 settings for the manual-combine transcode; output is for delivery, not archival, so favor encode speed
+X264_PRESET = os.environ.get("X264_PRESET", "ultrafast")
+X264_CRF = os.environ.get("X264_CRF", "28")  # Constant Rate Factor, lower is better, 18-28 is typical
+# Optional hardware H.264 encoder for that transcode: unset = libx264, "auto" = first available, or an encoder name
+HW_ENCODER = os.environ.get("HW_ENCODER", "").strip().lower()
+HW_ENCODER_ARGS = {
+    "h264_nvenc": ["-preset", "p1", "-tune", "ll", "-rc", "vbr", "-cq", "23", "-b:v", "0"],
+    "h264_qsv": ["-preset", "veryfast", "-global_quality", "23"],
+}
+
+# --- Precompiled Patterns ---
+# Plain character stripping uses str.translate tables (single C-level pass, no regex engine)
+_FILENAME_INVALID_CHARS = str.maketrans("", "", '<>:"/\\|?*')  # Invalid in filenames on common filesystems
+_FILENAME_SEPARATOR_RUNS = re.compile(r"[_\s]+")  # Underscore/whitespace runs, collapsed to one space
+_HEADER_QUOTES = str.maketrans("", "", "'\"")  # Quotes stripped from Content-Disposition filenames
+_YOUTUBE_VIDEO_ID = re.compile(
+    r"(?:youtube\.com\/(?:watch\?v=|shorts\/|live\/|embed\/|v\/)|youtu\.be\/)([a-zA-Z0-9_-]{11})"
+)
+_URL_T_PARAM = re.compile(r"[&?]t=([^&]+)")
+_VIDEO_RESOLUTION = re.compile(r"\s*(\d{2,5})(?:p\d*)?\s*", re.IGNORECASE)  # '1080', '1080p', '1080p60'
+# Files still being written: yt-dlp's .part/.part-FragN/.ytdl and merger .temp.<ext>, our own combine .mp4.part
+_IN_PROGRESS_FILE = re.compile(r"\.(?:part|ytdl)$|\.part-Frag\d+|\.temp\.\w+$")
+# --- End Precompiled Patterns ---
+
+
+@lru_cache(maxsize=1024)  # Same title is cleaned by /combine, the worker and the download route
 def clean_filename_for_storage(filename):
     if not filename or filename is None:
         return "video"
     filename = str(filename)
-    filename = re.sub(r'[<>:"/\\|?*]', "", filename)
-    filename = re.sub(r"_+", " ", filename)
-    filename = re.sub(r"\s+", " ", filename)
+    filename = filename.translate(_FILENAME_INVALID_CHARS)
+    filename = _FILENAME_SEPARATOR_RUNS.sub(" ", filename)
     filename = filename.strip()
     if len(filename) > 100:
         filename = filename[:100].strip()
@@ -128,40 +423,100 @@ def create_descriptive_filename(
     return descriptive_filename
 
 
+@lru_cache(maxsize=1024)
 def sanitize_for_http_header(filename):
     if not filename or filename is None:
         return "video"
     filename = str(filename)
-    filename = re.sub(r'[\'"]', "", filename)
+    filename = filename.translate(_HEADER_QUOTES)
     filename = filename.strip()
     if not filename:
         return "video"
     return quote(filename.encode("utf-8"), safe=" -.()[]!&")
 
 
-def cleanup_old_files(max_age_hours: int = 168) -> None:  # 7 days = 168 hours
-    """Remove processed files older than max_age_hours"""
+def _reconcile_processed_files_index() -> None:
+    """Add files on disk that the index doesn't know about (left from before a restart, stray partials)"""
     if not os.path.exists(PROCESSED_FILES_DIR):
-        app.logger.debug("Processed files directory does not exist, skipping cleanup")
         return
+    on_disk = {}
+    stale_temp_cutoff = time.time() - 24 * 3600
+    with os.scandir(PROCESSED_FILES_DIR) as entries:
+        for entry in entries:
+            # Dotfiles (the task database and its -wal/-shm files) are app state, not downloads
+            if entry.name.startswith("."):
+                continue
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                entry_stat = entry.stat()
+            except OSError:
+                continue  # Removed (e.g. a partial renamed into place) between readdir and stat
+            # In-progress temp files belong to running tasks: they must neither count toward the size cap nor be
+            # evicted. Only ones untouched for a day (left by a crash) are indexed, so cleanup can expire them
+            if _IN_PROGRESS_FILE.search(entry.name) and entry_stat.st_mtime >= stale_temp_cutoff:
+                continue
+            # mtime, not ctime: on Linux ctime is the inode change time, which chmod/chown/backups also bump
+            on_disk[entry.name] = (entry_stat.st_mtime, entry_stat.st_size)
+    with _processed_files_lock:
+        untracked_count = len(on_disk.keys() - _processed_files_index.keys())
+        on_disk.update(_processed_files_index)  # Entries registered by tasks take precedence
+        _processed_files_index.clear()
+        _processed_files_index.update(sorted(on_disk.items(), key=lambda item: item[1][0]))
+    if untracked_count:
+        app.logger.debug(f"🗂️ Indexed {untracked_count} untracked processed files")
+
+
+def register_processed_file(filename: str, size: int | None = None) -> None:
+    """Record a finished file in PROCESSED_FILES_DIR so cleanup can expire it by age or total size"""
+    if size is None:  # Callers that already know the file's size pass it along
+        try:
+            size = os.path.getsize(os.path.join(PROCESSED_FILES_DIR, filename))
+        except OSError:
+            return
+    with _processed_files_lock:
+        _processed_files_index[filename] = (time.time(), size)
+        _processed_files_index.move_to_end(filename)
+        total_bytes = sum(entry_size for _, entry_size in _processed_files_index.values())
+    if PROCESSED_FILES_MAX_BYTES and total_bytes > PROCESSED_FILES_MAX_BYTES:
+        cleanup_old_files()  # Enforce the size cap now rather than at the next daily sweep
 
+
+def cleanup_old_files(max_age_hours: int = 168) -> None:  # 7 days = 168 hours
+    """Remove processed files older than max_age_hours, then oldest-first while over PROCESSED_FILES_MAX_GB"""
     cutoff_time = time.time() - (max_age_hours * 3600)
     cleaned_count = 0
     total_size_mb = 0
 
     try:
-        for filename in os.listdir(PROCESSED_FILES_DIR):
-            filepath = os.path.join(PROCESSED_FILES_DIR, filename)
+        with _processed_files_lock:
+            total_bytes = sum(size for _, size in _processed_files_index.values())
+            newest_filename = next(reversed(_processed_files_index), None)
+            expired = []
+            # Oldest first: stop at the first file that is both fresh and within the size cap
+            for filename, (created_at, size) in _processed_files_index.items():
+                over_size_cap = PROCESSED_FILES_MAX_BYTES and total_bytes > PROCESSED_FILES_MAX_BYTES
+                if created_at >= cutoff_time and not over_size_cap:
+                    break
+                if filename == newest_filename and created_at >= cutoff_time:
+                    break  # Never evict the file that was just produced
+                expired.append((filename, size))
+                total_bytes -= size
+            for filename, _ in expired:
+                del _processed_files_index[filename]
+
+        for filename, size in expired:
             try:
-                # Check file age (creation time)
-                if os.path.getctime(filepath) < cutoff_time:
-                    file_size = os.path.getsize(filepath) / (1024 * 1024)  # MB
-                    os.remove(filepath)
-                    app.logger.info(f"🗑️ Cleaned up old file: {filename} ({file_size:.1f} MB)")
-                    cleaned_count += 1
-                    total_size_mb += file_size
+                os.remove(os.path.join(PROCESSED_FILES_DIR, filename))
+            except FileNotFoundError:
+                continue  # Already removed (e.g. by hand)
             except Exception as e:
                 app.logger.error(f"Error cleaning file {filename}: {e}")
+                continue
+            file_size = size / (1024 * 1024)  # MB
+            app.logger.info(f"🗑️ Cleaned up old file: {filename} ({file_size:.1f} MB)")
+            cleaned_count += 1
+            total_size_mb += file_size
 
         if cleaned_count > 0:
             app.logger.info(f"🧹 Cleanup complete: removed {cleaned_count} old files, freed {total_size_mb:.1f} MB")
@@ -178,19 +533,30 @@ def cleanup_old_tasks(max_age_hours: int = 24) -> None:  # 24 hours = 1 day
         cutoff_time = time.time() - (max_age_hours * 3600)
         cleaned_count = 0
 
-        # Create a list of task IDs to remove (can't modify dict during iteration)
+        # items() is a snapshot, so entries can be removed while other threads keep writing
         tasks_to_remove = []
 
-        for task_id, task_data in COMPLETED_TASKS.items():
+        for task_id, task_data in task_statuses.items():
             completed_at = task_data.get("completed_at", 0)
             if completed_at and completed_at < cutoff_time:
                 tasks_to_remove.append(task_id)
 
         # Remove old tasks
         for task_id in tasks_to_remove:
-            COMPLETED_TASKS.pop(task_id, None)
             task_statuses.pop(task_id, None)
             cleaned_count += 1
+        _delete_persisted_tasks_before(cutoff_time)
+
+        # Drop throttle timestamps of tasks that are gone (e.g. cancelled or failed before "finished")
+        for progress_key in [key for key in list(_last_progress_update) if key[0] not in task_statuses]:
+            _last_progress_update.pop(progress_key, None)
+        for cached_task_id in [key for key in list(_status_json_cache) if key not in task_statuses]:
+            _status_json_cache.pop(cached_task_id, None)
+        with _task_dedupe_lock:
+            for dedupe_key in [key for key, tid in _task_dedupe_index.items() if tid not in task_statuses]:
+                del _task_dedupe_index[dedupe_key]
+            for withdrawn_task_id in [tid for tid in _task_withdrawn if tid not in task_statuses]:
+                del _task_withdrawn[withdrawn_task_id]
 
         if cleaned_count > 0:
             app.logger.info(f"🧹 Task cleanup complete: removed {cleaned_count} old task records from memory")
@@ -201,25 +567,65 @@ def cleanup_old_tasks(max_age_hours: int = 24) -> None:  # 24 hours = 1 day
         app.logger.error(f"Error during task cleanup process: {e}")
 
 
+_cleanup_stop = threading.Event()  # Set at interpreter exit so the cleanup loop ends between sweeps
+
+
+def _cleanup_loop() -> None:
+    """Run cleanup now and then every 24 hours until _cleanup_stop is set"""
+    while True:
+        app.logger.info("🧹 Starting scheduled cleanup of old processed files and tasks...")
+        try:
+            _reconcile_processed_files_index()  # Daily pick-up of untracked files; tasks register their own output
+            cleanup_old_files(max_age_hours=168)  # Remove files older than 7 days
+            cleanup_old_tasks(max_age_hours=24)  # Remove task records older than 1 day
+        except Exception:
+            # Keep the loop alive: a failed sweep must not stop every later one
+            app.logger.exception("Error during scheduled cleanup")
+
+        app.logger.debug("🔄 Next cleanup scheduled in 24 hours")
+        if _cleanup_stop.wait(24 * 3600):
+            return
+
+
 def schedule_cleanup() -> None:
-    """Schedule periodic cleanup every 24 hours"""
-    app.logger.info("🧹 Starting scheduled cleanup of old processed files and tasks...")
-    cleanup_old_files(max_age_hours=168)  # Remove files older than 7 days
-    cleanup_old_tasks(max_age_hours=24)  # Remove task records older than 1 day
+    """Start the periodic cleanup on one long-lived daemon thread"""
+    # A single daemon loop instead of a re-armed Timer: no new thread per run, startup doesn't wait
+    # for the first sweep, and a non-daemon Timer no longer holds up worker shutdown
+    threading.Thread(target=_cleanup_loop, daemon=True, name="cleanup").start()
+    atexit.register(_cleanup_stop.set)
+
+
+def _progress_update_due(progress_key: tuple[str, str]) -> bool:
+    """Return True (and record the time) if progress_key's last status write is older than the throttle interval"""
+    now = time.monotonic()
+    if now - _last_progress_update.get(progress_key, 0.0) < PROGRESS_UPDATE_INTERVAL_SECONDS:
+        return False
+    _last_progress_update[progress_key] = now
+    return True
+
+
+def _add_stream_progress(phase: str, percent: float, status_patch: dict) -> None:
+    """Add a parallel stream's own percentage to status_patch; _average_stream_progress derives the overall figure"""
+    status_patch[f"{phase.removeprefix('downloading_')}_progress_percent"] = round(percent, 1)
+
 
-    # Schedule next cleanup in 24 hours
-    Timer(24 * 3600, schedule_cleanup).start()
-    app.logger.debug("🔄 Next cleanup scheduled in 24 hours")
+def _average_stream_progress(status: dict) -> dict:
+    """Overall progress of parallel video/audio downloads: the average of both streams' latest percentages"""
+    video_percent = status.get("video_progress_percent", 0)
+    audio_percent = status.get("audio_progress_percent", 0)
+    return {"progress_percent": round((video_percent + audio_percent) / 2, 1)}
 
 
-def _update_progress(task_id: str, progress_data: dict[str, any], phase: str = "downloading") -> None:
+def _update_progress(
+    task_id: str, progress_data: dict[str, any], phase: str = "downloading", cancel_event: threading.Event | None = None
+) -> None:
     """Update task progress from yt-dlp progress hooks"""
-    try:
-        # Check if task has been cancelled - abort download immediately
-        if task_id in cancelled_tasks:
-            app.logger.info(f"🚫 Task {task_id} cancelled during {phase}, aborting yt-dlp download")
-            raise Exception(f"Task {task_id} cancelled by user")
+    # Check if task has been cancelled - abort download immediately (outside the try so the error reaches yt-dlp)
+    if cancel_event is not None and cancel_event.is_set():
+        app.logger.info(f"🚫 Task {task_id} cancelled during {phase}, aborting yt-dlp download")
+        raise Exception(f"Task {task_id} cancelled by user")
 
+    try:
         status = progress_data.get("status")
 
         if status == "downloading":
@@ -233,66 +639,47 @@ def _update_progress(task_id: str, progress_data: dict[str, any], phase: str = "
             if total and total > 0:
                 progress_percent = min(100, (downloaded / total) * 100)
 
-            # Get current status or create new one
-            current_status = task_statuses.get(task_id, {})
-            current_status.update(
-                {
-                    "status": "processing",
-                    "phase": phase,
-                    "progress_percent": round(progress_percent, 1),
-                    "downloaded_bytes": downloaded,
-                    "total_bytes": total,
-                    "speed_bytes_per_sec": speed or 0,
-                    "eta_seconds": eta or 0,
-                    "message": f"{phase.replace('_', ' ').title()}: {progress_percent:.1f}%",
-                }
-            )
+            # yt-dlp calls this for every chunk but the UI polls about once a second; skip writes in between
+            if progress_percent < 100 and not _progress_update_due((task_id, phase)):
+                return
+
+            status_patch = {
+                "status": "processing",
+                "phase": phase,
+                "progress_percent": round(progress_percent, 1),
+                "downloaded_bytes": downloaded,
+                "total_bytes": total,
+                "speed_bytes_per_sec": speed or 0,
+                "eta_seconds": eta or 0,
+                "message": f"{phase.replace('_', ' ').title()}: {progress_percent:.1f}%",
+            }
+            # Video and audio download in parallel, so each stream also reports its own percentage. The average
+            # is taken under the status lock: built from a separate read, it could mix in a stale sibling value
+            derive = None
+            if phase in ("downloading_video", "downloading_audio"):
+                _add_stream_progress(phase, progress_percent, status_patch)
+                derive = _average_stream_progress
 
-            task_statuses[task_id] = current_status
-            COMPLETED_TASKS[task_id] = current_status
+            task_statuses.update(task_id, status_patch, derive)
 
         elif status == "finished":
-            current_status = task_statuses.get(task_id, {})
-            current_status.update(
-                {
-                    "status": "processing",
-                    "phase": f"{phase}_complete",
-                    "progress_percent": 100,
-                    "message": f"{phase.replace('_', ' ').title()} complete",
-                }
-            )
-            task_statuses[task_id] = current_status
-            COMPLETED_TASKS[task_id] = current_status
+            _last_progress_update.pop((task_id, phase), None)
+            status_patch = {
+                "status": "processing",
+                "phase": f"{phase}_complete",
+                "progress_percent": 100,
+                "message": f"{phase.replace('_', ' ').title()} complete",
+            }
+            derive = None
+            if phase in ("downloading_video", "downloading_audio"):
+                _add_stream_progress(phase, 100, status_patch)
+                derive = _average_stream_progress
+            task_statuses.update(task_id, status_patch, derive)
 
     except Exception as e:
         app.logger.error(f"Error updating progress for task {task_id}: {e}")
 
 
-def _postprocessor_hook(task_id: str, d: dict[str, any]) -> None:
-    """Update task status during yt-dlp postprocessing (FFmpeg transcoding)"""
-    try:
-        status = d.get("status")
-        postprocessor = d.get("postprocessor", "")
-
-        if status == "started" and "FFmpeg" in postprocessor:
-            # Transcoding phase started
-            current_status = task_statuses.get(task_id, {})
-            current_status.update(
-                {
-                    "status": "processing",
-                    "phase": "combining",
-                    "progress_percent": 0,
-                    "message": "Combining video and audio...",
-                }
-            )
-            task_statuses[task_id] = current_status
-            COMPLETED_TASKS[task_id] = current_status
-            app.logger.info(f"🔄 Task {task_id}: FFmpeg postprocessing started")
-
-    except Exception as e:
-        app.logger.error(f"Error in postprocessor hook for task {task_id}: {e}")
-
-
 def _mp3_postprocessor_hook(task_id: str, d: dict[str, any]) -> None:
     """Update task status during MP3 conversion for UI feedback"""
     try:
@@ -300,84 +687,138 @@ def _mp3_postprocessor_hook(task_id: str, d: dict[str, any]) -> None:
         postprocessor = d.get("postprocessor", "")
 
         if status == "started" and postprocessor == "ExtractAudio":
-            current_status = task_statuses.get(task_id, {})
-            current_status.update(
+            task_statuses.update(
+                task_id,
                 {
                     "status": "processing",
                     "phase": "converting_mp3",
                     "progress_percent": 100,  # Download complete, conversion starting
                     "message": "Converting to MP3...",
-                }
+                },
             )
-            task_statuses[task_id] = current_status
-            COMPLETED_TASKS[task_id] = current_status
             app.logger.info(f"🎵 Task {task_id}: MP3 conversion started")
 
         elif status == "finished":
-            current_status = task_statuses.get(task_id, {})
-            current_status.update(
+            task_statuses.update(
+                task_id,
                 {
                     "status": "processing",
                     "phase": "converting_mp3_complete",
                     "progress_percent": 95,
                     "message": "MP3 conversion complete",
-                }
+                },
             )
-            task_statuses[task_id] = current_status
-            COMPLETED_TASKS[task_id] = current_status
             app.logger.info(f"🎵 Task {task_id}: MP3 conversion finished")
 
     except Exception as e:
         app.logger.error(f"Error in MP3 postprocessor hook for task {task_id}: {e}")
 
 
-def _parse_ffmpeg_progress(task_id: str, stderr_line: str, total_duration: float) -> None:
-    """Parse FFmpeg stderr output and update task progress"""
+def _lower_process_priority(pid: int) -> None:
+    """Renice a child process and move it to the SCHED_BATCH policy where the platform supports it"""
+    # Applied from the parent after spawn: preexec_fn isn't safe to use from a multi-threaded process
     try:
-        # Check if task has been cancelled - signal to abort FFmpeg
-        if task_id in cancelled_tasks:
-            app.logger.info(f"🚫 Task {task_id} cancelled during FFmpeg combine, signaling abort")
-            raise Exception(f"Task {task_id} cancelled by user")
-
-        # FFmpeg outputs progress in format: "time=HH:MM:SS.ms ..."
-        # Example: "frame=  123 fps= 45 q=28.0 size=    1024kB time=00:00:05.12 bitrate=1638.4kbits/s speed=1.2x"
-        if "time=" in stderr_line:
-            # Extract time value - flexible regex for various FFmpeg formats
-            time_match = re.search(r"time=(\d+):(\d+):(\d+\.?\d*)", stderr_line)
-            if time_match and total_duration > 0:
-                hours, minutes, seconds = time_match.groups()
-                current_time = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
-
-                # Calculate percentage
-                progress_percent = min(100, (current_time / total_duration) * 100)
-
-                # Extract speed if available
-                speed_match = re.search(r"speed=\s*(\d+\.?\d*)x", stderr_line)
-                speed_text = speed_match.group(1) if speed_match else ""
-
-                # Update task status
-                current_status = task_statuses.get(task_id, {})
-                current_status.update(
-                    {
-                        "status": "processing",
-                        "phase": "combining",
-                        "progress_percent": round(progress_percent, 1),
-                        "message": f"Combining: {progress_percent:.1f}%" + (f" ({speed_text}x)" if speed_text else ""),
-                    }
-                )
+        if hasattr(os, "setpriority"):
+            os.setpriority(os.PRIO_PROCESS, pid, FFMPEG_NICE)
+        if hasattr(os, "sched_setscheduler"):  # Linux only
+            os.sched_setscheduler(pid, os.SCHED_BATCH, os.sched_param(0))
+    except OSError as e:
+        app.logger.debug(f"Could not lower priority of process {pid}: {e}")
+
+
+@contextmanager
+def _transcode_slot(task_id: str, cancel_event: threading.Event | None = None):
+    """Hold one of the FFMPEG_TRANSCODE_JOBS slots, giving up if the task is cancelled while waiting for it"""
+    if not _transcode_slots.acquire(blocking=False):
+        app.logger.info(f"⏳ Task {task_id}: All {FFMPEG_TRANSCODE_JOBS} transcode slots busy, waiting for encoder")
+        task_statuses.update(task_id, {"waiting_for_encoder": True, "message": "Waiting for encoder..."})
+        # Wait in short steps so a cancel is noticed here instead of after the slot frees up
+        while not _transcode_slots.acquire(timeout=TRANSCODE_SLOT_POLL_SECONDS):
+            if cancel_event is not None and cancel_event.is_set():
+                app.logger.info(f"🚫 Task {task_id} cancelled while waiting for a transcode slot")
+                raise Exception(f"Task {task_id} cancelled by user")
+        task_statuses.update(task_id, {"waiting_for_encoder": False, "message": "Combining video and audio..."})
+    try:
+        yield
+    finally:
+        _transcode_slots.release()
+
+
+@lru_cache(maxsize=1)  # Probe FFmpeg once; the encoder list can't change while the process runs
+def _resolve_h264_encoder() -> str:
+    """Return the H.264 encoder for transcodes: HW_ENCODER if FFmpeg has it, else libx264"""
+    if not HW_ENCODER:
+        return "libx264"
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True, timeout=10, check=True
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        app.logger.warning(f"⚠️ Could not list FFmpeg encoders ({e}), using libx264")
+        return "libx264"
+    candidates = list(HW_ENCODER_ARGS) if HW_ENCODER == "auto" else [HW_ENCODER]
+    for encoder in candidates:
+        if encoder in HW_ENCODER_ARGS and f" {encoder} " in result.stdout:
+            app.logger.info(f"🎛️ Using hardware encoder {encoder} for H.264 transcodes")
+            return encoder
+    app.logger.warning(f"⚠️ Hardware encoder '{HW_ENCODER}' not available in FFmpeg, using libx264")
+    return "libx264"
+
+
+def _h264_encoder_args() -> list[str]:
+    """FFmpeg video codec arguments for transcoding to H.264"""
+    encoder = _resolve_h264_encoder()
+    if encoder == "libx264":
+        return ["-c:v", "libx264", "-crf", X264_CRF, "-preset", X264_PRESET, "-threads", X264_THREADS]
+    return ["-c:v", encoder, *HW_ENCODER_ARGS[encoder]]
+
+
+def _parse_ffmpeg_progress(
+    task_id: str,
+    progress_fields: dict[bytes, bytes],
+    total_duration: float,
+    cancel_event: threading.Event | None = None,
+) -> None:
+    """Update task progress from one block of FFmpeg -progress key=value output"""
+    # Check if task has been cancelled - signal to abort FFmpeg
+    if cancel_event is not None and cancel_event.is_set():
+        app.logger.info(f"🚫 Task {task_id} cancelled during FFmpeg combine, signaling abort")
+        raise Exception(f"Task {task_id} cancelled by user")
 
-                task_statuses[task_id] = current_status
-                COMPLETED_TASKS[task_id] = current_status
+    try:
+        # Output position in microseconds ("N/A" until the first frame); out_time_ms is the same value on older FFmpeg
+        out_time_us = progress_fields.get(b"out_time_us") or progress_fields.get(b"out_time_ms", b"")
+        if not out_time_us.isdigit() or total_duration <= 0:
+            return
+        current_time = int(out_time_us) / 1_000_000
+
+        # Calculate percentage
+        progress_percent = min(100, (current_time / total_duration) * 100)
+        if progress_percent < 99 and not _progress_update_due((task_id, "combining")):
+            return
+
+        # Speed is reported like "1.23x", or "N/A" before it is known
+        speed_text = progress_fields.get(b"speed", b"").decode().strip().removesuffix("x")
+        if not speed_text[:1].isdigit():
+            speed_text = ""
+
+        # Update task status
+        task_statuses.update(
+            task_id,
+            {
+                "status": "processing",
+                "phase": "combining",
+                "progress_percent": round(progress_percent, 1),
+                "message": f"Combining: {progress_percent:.1f}%" + (f" ({speed_text}x)" if speed_text else ""),
+            },
+        )
 
-                # Log progress updates every 10% for debugging
-                if int(progress_percent) % 10 == 0 or progress_percent >= 99:
-                    app.logger.info(f"🎬 Task {task_id}: FFmpeg progress: {progress_percent:.1f}% ({speed_text}x)")
+        # Log progress updates every 10% for debugging (lazy %-args: this runs for every progress block)
+        if int(progress_percent) % 10 == 0 or progress_percent >= 99:
+            app.logger.info("🎬 Task %s: FFmpeg progress: %.1f%% (%sx)", task_id, progress_percent, speed_text)
 
     except Exception as e:
         app.logger.error(f"Error parsing FFmpeg progress for task {task_id}: {e}")
-        # Re-raise cancellation exceptions so they propagate to kill the FFmpeg process
-        if task_id in cancelled_tasks:
-            raise
 
 
 @app.route("/")
@@ -397,8 +838,9 @@ def health():
         stat = os.statvfs(PROCESSED_FILES_DIR if os.path.exists(PROCESSED_FILES_DIR) else "/")
         disk_free_gb = (stat.f_bavail * stat.f_frsize) / (1024**3)
 
-        # Check worker thread
-        worker_alive = worker_thread.is_alive() if "worker_thread" in globals() else False
+        # Check worker threads
+        workers_alive = sum(t.is_alive() for t in worker_threads) if "worker_threads" in globals() else 0
+        worker_alive = workers_alive == DL_WORKERS
 
         # Check queue size
         queue_size = task_queue.qsize()
@@ -406,14 +848,19 @@ def health():
         # Count processed files
         processed_files_count = 0
         if os.path.exists(PROCESSED_FILES_DIR):
-            processed_files_count = len(
-                [f for f in os.listdir(PROCESSED_FILES_DIR) if os.path.isfile(os.path.join(PROCESSED_FILES_DIR, f))]
-            )
+            # scandir's DirEntry carries the file type from the directory read, so no stat() per file
+            with os.scandir(PROCESSED_FILES_DIR) as entries:
+                processed_files_count = sum(
+                    1 for entry in entries if entry.is_file(follow_symlinks=False) and not entry.name.startswith(".")
+                )
 
         health_status = {
             "status": "healthy",
             "queue_size": queue_size,
+            "queue_max": MAX_QUEUE,
             "worker_alive": worker_alive,
+            "workers_alive": workers_alive,
+            "workers_total": DL_WORKERS,
             "disk_free_gb": round(disk_free_gb, 2),
             "processed_files_count": processed_files_count,
             "uptime_seconds": int(time.time() - app.start_time) if hasattr(app, "start_time") else 0,
@@ -422,11 +869,11 @@ def health():
         # Determine if unhealthy based on thresholds
         if not worker_alive:
             health_status["status"] = "unhealthy"
-            health_status["message"] = "Worker thread is not running"
+            health_status["message"] = f"Only {workers_alive} of {DL_WORKERS} worker threads are running"
         elif disk_free_gb < 1:
             health_status["status"] = "warning"
             health_status["message"] = "Low disk space"
-        elif queue_size > 100:
+        elif queue_size > 0.8 * MAX_QUEUE:
             health_status["status"] = "warning"
             health_status["message"] = "Large queue size"
 
@@ -437,15 +884,14 @@ def health():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@lru_cache(maxsize=1024)  # Pure function of the URL; /extract, /combine and the worker re-clean the same URLs
 def clean_youtube_url(url):
-    video_id_match = re.search(r"(?:youtube\.com\/(?:watch\?v=|shorts\/|live\/|embed\/|v\/)|youtu\.be\/)([a-zA-Z0-9_-]{11})", url)
+    video_id_match = _YOUTUBE_VIDEO_ID.search(url)
     if not video_id_match:
         return url
     video_id = video_id_match.group(1)
     timestamp = None
     try:
-        from urllib.parse import parse_qs, urlparse
-
         parsed = urlparse(url)
         if parsed.query:
             params = parse_qs(parsed.query)
@@ -456,7 +902,7 @@ def clean_youtube_url(url):
         if parsed.fragment and parsed.fragment.startswith("t="):
             timestamp = parsed.fragment[2:]
         if "&t=" in url:
-            t_match = re.search(r"[&?]t=([^&]+)", url)
+            t_match = _URL_T_PARAM.search(url)
             if t_match:
                 timestamp = t_match.group(1)
     except Exception:  # Catch all exceptions during timestamp parsing
@@ -467,6 +913,116 @@ def clean_youtube_url(url):
     return clean_url
 
 
+def _get_info_ydl() -> yt_dlp.YoutubeDL:
+    """Return this thread's long-lived metadata YoutubeDL, creating it on first use"""
+    # YoutubeDL isn't thread-safe, so each request thread keeps its own instance; reusing it
+    # keeps the HTTP session and in-memory player/signature caches warm between requests
+    ydl = getattr(_info_ydl_local, "ydl", None)
+    if ydl is None:
+        ydl_opts = {
+            "quiet": False,
+            "no_warnings": False,
+            "extract_flat": False,
+            "socket_timeout": 300,
+            **get_ytdlp_base_opts(),
+        }
+        ydl = _info_ydl_local.ydl = yt_dlp.YoutubeDL(ydl_opts)
+    return ydl
+
+
+def _get_cached_info(clean_url: str) -> dict | None:
+    """Return cached metadata for clean_url if it is still within the TTL"""
+    with _extract_cache_lock:
+        cached = _extract_cache.get(clean_url)
+    if cached and time.time() - cached[0] < EXTRACT_CACHE_TTL_SECONDS:
+        return cached[1]
+    return None
+
+
+def get_cached_format(clean_url: str, format_id: str) -> dict:
+    """Return the cached yt-dlp format dict for format_id, or {} if the video isn't cached"""
+    with _extract_cache_lock:
+        cached = _extract_cache.get(clean_url)
+    if cached and time.time() - cached[0] < EXTRACT_CACHE_TTL_SECONDS:
+        return cached[2].get(format_id, {})
+    return {}
+
+
+def extract_info_cached(clean_url: str) -> dict:
+    """Return yt-dlp metadata for clean_url, served from the in-memory cache while fresh"""
+    info = _get_cached_info(clean_url)
+    if info is not None:
+        app.logger.debug("💾 Metadata cache hit for %s", clean_url)  # Lazy %-args: hit on every cached lookup
+        return info
+
+    # Only one request extracts a given URL at a time; concurrent requests wait and reuse its result
+    with _extract_cache_lock:
+        url_lock = _extract_url_locks.setdefault(clean_url, threading.Lock())
+
+    with url_lock:
+        info = _get_cached_info(clean_url)
+        if info is not None:
+            app.logger.debug("💾 Metadata cache hit for %s (after waiting on concurrent extraction)", clean_url)
+            return info
+
+        try:
+            ydl = _get_info_ydl()
+            # sanitize_info drops non-serializable entries so only plain data is kept in the cache. Private keys go too,
+            # as for --load-info-json: a cached requested_formats from the default selection would otherwise make
+            # every reprocessed download fetch that selection instead of the format its YoutubeDL asks for
+            info = ydl.sanitize_info(ydl.extract_info(clean_url, download=False), remove_private_keys=True)
+
+            now = time.time()
+            with _extract_cache_lock:
+                # Evict expired entries while we hold the lock so the cache can't grow without bound
+                expired_urls = [
+                    u for u, (cached_at, *_) in _extract_cache.items() if now - cached_at >= EXTRACT_CACHE_TTL_SECONDS
+                ]
+                for expired_url in expired_urls:
+                    del _extract_cache[expired_url]
+                # Index formats once so per-task format lookups are O(1)
+                formats_by_id = {fmt["format_id"]: fmt for fmt in info.get("formats", []) if fmt.get("format_id")}
+                _extract_cache[clean_url] = (now, info, formats_by_id)
+        finally:
+            with _extract_cache_lock:
+                _extract_url_locks.pop(clean_url, None)
+    return info
+
+
+def download_with_cached_info(ydl: yt_dlp.YoutubeDL, clean_url: str) -> None:
+    """Download clean_url with ydl, reusing the cached /extract metadata instead of re-extracting"""
+    # On a cache miss this extracts once and caches the result, so the parallel video/audio downloads
+    # of a manual combine (and any later task for the same video) share a single extraction
+    info = extract_info_cached(clean_url)
+    # process_ie_result annotates the dict it is given, so hand it a copy of the shared cache entry
+    ydl.process_ie_result(copy.deepcopy(info), download=True)
+
+
+@app.route("/cache/invalidate", methods=["POST"])
+def invalidate_extract_cache():
+    """Drop cached metadata for one URL (JSON body {"url": ...}) or the whole cache if no URL is given"""
+    data = request.get_json(silent=True) or {}
+    url = data.get("url")
+    with _extract_cache_lock:
+        if url:
+            removed = 1 if _extract_cache.pop(clean_youtube_url(url), None) else 0
+        else:
+            removed = len(_extract_cache)
+            _extract_cache.clear()
+    app.logger.info(f"🗑️ Invalidated {removed} cached metadata entries")
+    return jsonify({"success": True, "removed": removed}), 200
+
+
+def _video_quality_key(fmt: dict) -> int:
+    """Sort key for video formats: frame height"""
+    return fmt.get("height", 0) or 0
+
+
+def _audio_quality_key(fmt: dict) -> float:
+    """Sort key for audio formats: numeric bitrate ('abr', then 'tbr'); the 'quality' label is derived from these"""
+    return fmt.get("abr") or fmt.get("tbr") or 0
+
+
 @app.route("/extract", methods=["POST"])
 def extract_video_info():
     try:
@@ -478,180 +1034,149 @@ def extract_video_info():
         clean_url = clean_youtube_url(url)
         app.logger.info(f"🎬 Extracting from: {clean_url}")
         if clean_url != url:
-            app.logger.debug(f"🧹 Cleaned URL from original: {url}")  # Changed to debug, less critical
-
-        ydl_opts = {"quiet": False, "no_warnings": False, "extract_flat": False, "socket_timeout": 300, **get_ytdlp_base_opts()}
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(clean_url, download=False)
-
-            # Removed verbose raw format logging block
-
-            video_data = {
-                "title": info.get("title", "Unknown"),
-                "thumbnail_url": info.get("thumbnail", None),
-                "duration": info.get("duration_string", "Unknown"),
-                "duration_seconds": info.get("duration", 0),  # Raw duration in seconds for FFmpeg progress
-                "uploader": info.get("uploader", "Unknown"),
-                "view_count": (f"{info.get('view_count', 0):,}" if info.get("view_count") else "Unknown"),
-                "upload_date": info.get("upload_date", "Unknown"),
-                "formats": [],
+            app.logger.debug("🧹 Cleaned URL from original: %s", url)  # Changed to debug, less critical
+
+        info = extract_info_cached(clean_url)
+
+        video_data = {
+            "title": info.get("title", "Unknown"),
+            "thumbnail_url": info.get("thumbnail", None),
+            "duration": info.get("duration_string", "Unknown"),
+            "duration_seconds": info.get("duration", 0),  # Raw duration in seconds for FFmpeg progress
+            "uploader": info.get("uploader", "Unknown"),
+            "view_count": (f"{info.get('view_count', 0):,}" if info.get("view_count") else "Unknown"),
+            "upload_date": info.get("upload_date", "Unknown"),
+            "formats": [],
+        }
+        title_for_log = video_data["title"]
+        if len(title_for_log) > 50:
+            title_for_log = title_for_log[:47] + "..."
+        app.logger.info(f"📝 Processing: \"{title_for_log}\" by {video_data['uploader']}")
+        # Bucket formats by type as they are classified so we only walk the format list once
+        formats_by_type = {"video+audio": [], "video-only": [], "audio-only": [], "other": []}
+        # First video-only format seen per height, collected in the same pass instead of a sort plus a second loop
+        unique_resolutions = {}
+        for fmt in info.get("formats", []):
+            fmt_get = fmt.get  # Bound once; this loop calls it ~20 times per format
+            # Skip URL-less formats and storyboards before building an entry that would be thrown away
+            if not fmt_get("url") or fmt_get("format_note") == "storyboard" or fmt_get("ext") == "mhtml":
+                continue
+            format_entry = {
+                "format_id": fmt_get("format_id", ""),
+                "ext": fmt_get("ext", ""),
+                "vcodec": fmt_get("vcodec", "none"),
+                "acodec": fmt_get("acodec", "none"),
+                "url": fmt_get("url", ""),
+                "protocol": fmt_get("protocol", "unknown"),
+                "height": fmt_get("height"),
+                "width": fmt_get("width"),
+                "abr": fmt_get("abr"),
+                "tbr": fmt_get("tbr"),
+                "fps": fmt_get("fps"),
             }
-            title_for_log = video_data["title"]
-            if len(title_for_log) > 50:
-                title_for_log = title_for_log[:47] + "..."
-            app.logger.info(f"📝 Processing: \"{title_for_log}\" by {video_data['uploader']}")
-            for fmt in info.get("formats", []):
-                if fmt.get("url"):
-                    format_entry = {
-                        "format_id": fmt.get("format_id", ""),
-                        "ext": fmt.get("ext", ""),
-                        "vcodec": fmt.get("vcodec", "none"),
-                        "acodec": fmt.get("acodec", "none"),
-                        "url": fmt.get("url", ""),
-                        "protocol": fmt.get("protocol", "unknown"),
-                        "height": fmt.get("height"),
-                        "width": fmt.get("width"),
-                        "abr": fmt.get("abr"),
-                        "tbr": fmt.get("tbr"),
-                        "fps": fmt.get("fps"),
-                    }
-                    # Skip storyboards early
-                    if fmt.get("format_note") == "storyboard" or fmt.get("ext") == "mhtml":
-                        continue
 
-                    vcodec_val = format_entry["vcodec"]  # Uses 'none' if original was None/missing
-                    acodec_val = format_entry["acodec"]  # Uses 'none' if original was None/missing
-
-                    is_video_stream = vcodec_val != "none" and fmt.get("height") is not None
-                    is_audio_stream_explicit = acodec_val != "none"
-
-                    # Infer audio if vcodec is 'none' and it's not a storyboard (already filtered storyboards)
-                    # This handles cases where yt-dlp might return acodec as None for an HLS audio stream
-                    # (e.g., format 233, 234 in logs)
-                    is_inferred_audio = vcodec_val == "none"
-
-                    if is_video_stream and is_audio_stream_explicit:
-                        format_entry["type"] = "video+audio"
-                        format_entry["quality"] = f"{fmt.get('height')}p"
-                    elif is_video_stream:
-                        format_entry["type"] = "video-only"
-                        format_entry["quality"] = f"{fmt.get('height')}p"
-                    elif is_audio_stream_explicit or is_inferred_audio:
-                        format_entry["type"] = "audio-only"
-                        if format_entry["protocol"] in ["m3u8", "m3u8_native"]:
-                            format_entry["ext"] = "m4a"  # Ensure HLS audio is marked for m4a output
-                            format_entry["acodec"] = "aac"  # Assume AAC for HLS audio converted to m4a
-                        current_abr = fmt.get("abr")
-                        current_tbr = fmt.get("tbr")
-                        if current_abr:
-                            format_entry["quality"] = f"{current_abr:.0f}kbps"
-                        elif current_tbr:
-                            format_entry["quality"] = f"{current_tbr:.0f}kbps (approx)"
-                        else:
-                            format_entry["quality"] = fmt.get("format_note", "Audio")
-
-                        # If it's an HLS audio stream, we know we'll convert it to m4a
-                        if format_entry["protocol"] in ["m3u8", "m3u8_native"]:
-                            app.logger.debug(
-                                f"🎧 HLS audio {format_entry['format_id']} detected. Ext: m4a. "
-                                f"Original: {format_entry['ext']}"
-                            )
-                            format_entry["ext"] = "m4a"
-
-                    else:
-                        format_entry["type"] = "other"
-                        format_entry["quality"] = fmt.get("format_note", "Unknown")
-
-                    # Handle filesize display
-                    filesize_bytes = fmt.get("filesize") or fmt.get("filesize_approx")
-                    if filesize_bytes:
-                        format_entry["filesize"] = f"{filesize_bytes / (1024*1024):.1f} MB"
-                    else:
-                        format_entry["filesize"] = "N/A"  # Use N/A for unknown or zero size
-                    video_data["formats"].append(format_entry)
-
-            video_audio_formats = [f for f in video_data["formats"] if f["type"] == "video+audio"]
-            video_only_formats = [f for f in video_data["formats"] if f["type"] == "video-only"]
-            audio_only_formats = [f for f in video_data["formats"] if f["type"] == "audio-only"]
-            other_formats = [f for f in video_data["formats"] if f["type"] == "other"]
-
-            def sort_by_quality(format_list, is_audio=False):
-                def get_quality_number(fmt):
-                    if is_audio:
-                        # Prioritize 'abr', then 'tbr', then parse 'quality' string as last resort
-                        abr = fmt.get("abr")
-                        if abr is not None:
-                            return int(abr)
-
-                        tbr = fmt.get("tbr")
-                        if tbr is not None:
-                            return int(tbr)
-
-                        # Fallback to parsing the 'quality' string if ABR/TBR are missing
-                        quality_str = fmt.get("quality", "0")
-                        match = re.search(r"(\d+)", quality_str.replace("kbps", ""))
-                        return int(match.group(1)) if match else 0
-                    else:
-                        return fmt.get("height", 0) or 0
-
-                return sorted(format_list, key=get_quality_number, reverse=True)
-
-            video_audio_formats = sort_by_quality(video_audio_formats)
-            video_only_formats = sort_by_quality(video_only_formats)
-            audio_only_formats = sort_by_quality(audio_only_formats, is_audio=True)
-
-            # Add MP3 conversion options if audio formats exist
-            if audio_only_formats:
-                best_audio = audio_only_formats[0]  # Highest quality audio
-                duration_secs = video_data.get("duration_seconds", 0)
-
-                # Add MP3 options at different bitrates
-                for mp3_bitrate_kbps in [192, 128]:
-                    if duration_secs:
-                        estimated_mp3_size_mb = (duration_secs * mp3_bitrate_kbps) / 8 / 1000
-                        estimated_size_str = f"{estimated_mp3_size_mb:.1f} MB"
-                    else:
-                        estimated_size_str = "N/A"
-                    mp3_option = {
-                        "format_id": f"bestaudio_mp3_{mp3_bitrate_kbps}",  # e.g., bestaudio_mp3_192
-                        "ext": "mp3",
-                        "type": "audio-only",
-                        "quality": f"{mp3_bitrate_kbps}kbps",  # Match format: ###kbps
-                        "acodec": "mp3",
-                        "abr": mp3_bitrate_kbps,  # For sorting and bitrate detection
-                        "protocol": "conversion",
-                        "filesize": estimated_size_str,
-                        "source_format_id": best_audio.get("format_id"),  # Track source for logging
-                    }
-                    audio_only_formats.append(mp3_option)
-
-            unique_resolutions = {}
-            for fmt in video_only_formats:
-                height = fmt.get("height")
-                # Add format if height exists and is not already in our collection
-                if height and height not in unique_resolutions:
-                    unique_resolutions[height] = fmt
-
-            sorted_heights = sorted(unique_resolutions.keys(), reverse=True)
-            # Include all unique resolutions 480p and above
-            video_only_formats_for_combine = []
-            for height in sorted_heights:
-                if height >= 480:
-                    video_only_formats_for_combine.append(unique_resolutions[height])
-            # Removed debug print for video_only_formats_for_combine
-            video_only_formats = video_only_formats_for_combine
-
-            video_data["formats"] = video_audio_formats + video_only_formats + audio_only_formats + other_formats
-            title_for_log = video_data.get("title", "Unknown Title")
-            if len(title_for_log) > 40:
-                title_for_log = title_for_log[:37] + "..."
-            app.logger.info(f"✅ Extracted {len(video_data['formats'])} formats for \"{title_for_log}\"")
-            return jsonify(video_data)
+            vcodec_val = format_entry["vcodec"]  # Uses 'none' if original was None/missing
+            acodec_val = format_entry["acodec"]  # Uses 'none' if original was None/missing
+
+            is_video_stream = vcodec_val != "none" and fmt_get("height") is not None
+            is_audio_stream_explicit = acodec_val != "none"
+
+            # Infer audio if vcodec is 'none' and it's not a storyboard (already filtered storyboards)
+            # This handles cases where yt-dlp might return acodec as None for an HLS audio stream
+            # (e.g., format 233, 234 in logs)
+            is_inferred_audio = vcodec_val == "none"
+
+            if is_video_stream and is_audio_stream_explicit:
+                format_entry["type"] = "video+audio"
+                format_entry["quality"] = f"{fmt_get('height')}p"
+            elif is_video_stream:
+                format_entry["type"] = "video-only"
+                format_entry["quality"] = f"{fmt_get('height')}p"
+                unique_resolutions.setdefault(fmt_get("height"), format_entry)
+            elif is_audio_stream_explicit or is_inferred_audio:
+                format_entry["type"] = "audio-only"
+                if format_entry["protocol"] in HLS_PROTOCOLS:
+                    format_entry["ext"] = "m4a"  # Ensure HLS audio is marked for m4a output
+                    format_entry["acodec"] = "aac"  # Assume AAC for HLS audio converted to m4a
+                current_abr = fmt_get("abr")
+                current_tbr = fmt_get("tbr")
+                if current_abr:
+                    format_entry["quality"] = f"{current_abr:.0f}kbps"
+                elif current_tbr:
+                    format_entry["quality"] = f"{current_tbr:.0f}kbps (approx)"
+                else:
+                    format_entry["quality"] = fmt_get("format_note", "Audio")
+
+                # If it's an HLS audio stream, we know we'll convert it to m4a
+                if format_entry["protocol"] in HLS_PROTOCOLS:
+                    # Lazy %-args: this runs once per format, so skip formatting when DEBUG is off
+                    app.logger.debug(
+                        "🎧 HLS audio %s detected. Ext: m4a. Original: %s",
+                        format_entry["format_id"],
+                        fmt_get("ext", ""),
+                    )
+                    format_entry["ext"] = "m4a"
+
+            else:
+                format_entry["type"] = "other"
+                format_entry["quality"] = fmt_get("format_note", "Unknown")
+
+            # Handle filesize display
+            filesize_bytes = fmt_get("filesize") or fmt_get("filesize_approx")
+            if filesize_bytes:
+                format_entry["filesize"] = f"{filesize_bytes / (1024*1024):.1f} MB"
+            else:
+                format_entry["filesize"] = "N/A"  # Use N/A for unknown or zero size
+            formats_by_type[format_entry["type"]].append(format_entry)
+
+        video_audio_formats = formats_by_type["video+audio"]
+        audio_only_formats = formats_by_type["audio-only"]
+        other_formats = formats_by_type["other"]
+
+        # Sort each bucket in place, best quality first
+        video_audio_formats.sort(key=_video_quality_key, reverse=True)
+        audio_only_formats.sort(key=_audio_quality_key, reverse=True)
+
+        # Add MP3 conversion options if audio formats exist
+        if audio_only_formats:
+            best_audio = audio_only_formats[0]  # Highest quality audio
+            duration_secs = video_data.get("duration_seconds", 0)
+
+            # Add MP3 options at different bitrates
+            for mp3_bitrate_kbps in [192, 128]:
+                if duration_secs:
+                    estimated_mp3_size_mb = (duration_secs * mp3_bitrate_kbps) / 8 / 1000
+                    estimated_size_str = f"{estimated_mp3_size_mb:.1f} MB"
+                else:
+                    estimated_size_str = "N/A"
+                mp3_option = {
+                    "format_id": f"bestaudio_mp3_{mp3_bitrate_kbps}",  # e.g., bestaudio_mp3_192
+                    "ext": "mp3",
+                    "type": "audio-only",
+                    "quality": f"{mp3_bitrate_kbps}kbps",  # Match format: ###kbps
+                    "acodec": "mp3",
+                    "abr": mp3_bitrate_kbps,  # For sorting and bitrate detection
+                    "protocol": "conversion",
+                    "filesize": estimated_size_str,
+                    "source_format_id": best_audio.get("format_id"),  # Track source for logging
+                }
+                audio_only_formats.append(mp3_option)
+
+        # Include all unique resolutions 480p and above, highest first
+        video_only_formats = [
+            unique_resolutions[height] for height in sorted(unique_resolutions, reverse=True) if height >= 480
+        ]
+
+        video_data["formats"] = video_audio_formats + video_only_formats + audio_only_formats + other_formats
+        title_for_log = video_data.get("title", "Unknown Title")
+        if len(title_for_log) > 40:
+            title_for_log = title_for_log[:37] + "..."
+        app.logger.info(f"✅ Extracted {len(video_data['formats'])} formats for \"{title_for_log}\"")
+        return jsonify(video_data)
 
     except Exception as e:
         url_for_log = clean_url if "clean_url" in locals() else "unknown URL"
-        app.logger.error(f"❌ Extraction failed for {url_for_log}: {e!s}")
-        traceback.print_exc()
+        app.logger.exception(f"❌ Extraction failed for {url_for_log}: {e!s}")
         return jsonify({"error": f"Failed to extract video information: {e!s}"}), 500
 
 
@@ -665,6 +1190,9 @@ def _manual_combine_for_worker(
     video_resolution,
     temp_dir_path,
     video_duration=0,
+    audio_acodec="",
+    cancel_event=None,
+    video_vcodec="",
 ):
     """Manually download video and audio, then combine with FFmpeg. Called by worker."""
     app.logger.info(f"🔧 Task {task_id}: Starting manual FFmpeg combine. Temp: {temp_dir_path}")
@@ -677,10 +1205,23 @@ def _manual_combine_for_worker(
         # Use descriptive filename with title and quality info
         final_disk_filename = create_descriptive_filename(clean_title, task_id, "mp4", video_resolution)
         final_output_path_on_disk = os.path.join(PROCESSED_FILES_DIR, final_disk_filename)
+        # FFmpeg writes next to the target and the file is renamed into place only once it is complete
+        part_output_path = f"{final_output_path_on_disk}.part"
 
         app.logger.info(f"📝 Task {task_id}: Manual combine target: {final_output_path_on_disk}")
 
-        # Download video stream
+        # Video and audio are independent CDN transfers, so download them in parallel
+        # Set when either stream fails so the other one stops at its next progress hook instead of finishing for nothing
+        stream_failed = threading.Event()
+
+        def _stream_progress_hook(phase):
+            def hook(d):
+                if stream_failed.is_set():
+                    raise Exception(f"Task {task_id}: {phase.removeprefix('downloading_')} download aborted")
+                _update_progress(task_id, d, phase, cancel_event)
+
+            return hook
+
         ydl_video_opts = {
             "format": video_format_id,
             "outtmpl": video_path,
@@ -688,17 +1229,9 @@ def _manual_combine_for_worker(
             "no_warnings": True,
             "verbose": False,
             "noplaylist": True,
-            "progress_hooks": [lambda d: _update_progress(task_id, d, phase="downloading_video")],
+            "progress_hooks": [_stream_progress_hook("downloading_video")],
             **get_ytdlp_base_opts(),
         }
-        with yt_dlp.YoutubeDL(ydl_video_opts) as ydl:
-            app.logger.info(f"⏬ Task {task_id}: Downloading video for manual combine...")
-            ydl.download([clean_url])
-        if not os.path.exists(video_path):
-            raise Exception(f"Video download failed for manual combine: {video_path} not found.")
-        app.logger.info(f"✅ Task {task_id}: Video download complete: {video_path}")
-
-        # Download audio stream
         ydl_audio_opts = {
             "format": audio_format_id,
             "outtmpl": audio_path,
@@ -706,99 +1239,141 @@ def _manual_combine_for_worker(
             "no_warnings": True,
             "verbose": False,
             "noplaylist": True,
-            "progress_hooks": [lambda d: _update_progress(task_id, d, phase="downloading_audio")],
+            "progress_hooks": [_stream_progress_hook("downloading_audio")],
             **get_ytdlp_base_opts(),
         }
-        with yt_dlp.YoutubeDL(ydl_audio_opts) as ydl:
-            app.logger.info(f"⏬ Task {task_id}: Downloading audio for manual combine...")
-            ydl.download([clean_url])
+
+        def _download_stream(ydl_opts, stream_label):
+            try:
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    app.logger.info(f"⏬ Task {task_id}: Downloading {stream_label} for manual combine...")
+                    download_with_cached_info(ydl, clean_url)
+            except BaseException:
+                stream_failed.set()
+                raise
+
+        video_future = stream_download_executor.submit(_download_stream, ydl_video_opts, "video")
+        audio_future = stream_download_executor.submit(_download_stream, ydl_audio_opts, "audio")
+        # Let both finish (a failed one stops its sibling) so temp cleanup never runs under a live download;
+        # result() then re-raises download errors (including cancellation) in this thread
+        wait((video_future, audio_future))
+        video_future.result()
+        audio_future.result()
+
+        if not os.path.exists(video_path):
+            raise Exception(f"Video download failed for manual combine: {video_path} not found.")
+        app.logger.info(f"✅ Task {task_id}: Video download complete: {video_path}")
         if not os.path.exists(audio_path):
             raise Exception(f"Audio download failed for manual combine: {audio_path} not found.")
         app.logger.info(f"✅ Task {task_id}: Audio download complete: {audio_path}")
 
         # Update status for combining phase
-        current_status = task_statuses.get(task_id, {})
-        current_status.update(
+        task_statuses.update(
+            task_id,
             {
                 "status": "processing",
                 "phase": "combining",
                 "progress_percent": 0,
                 "message": "Combining video and audio...",
-            }
+            },
         )
-        task_statuses[task_id] = current_status
-        COMPLETED_TASKS[task_id] = current_status
 
         # Combine with ffmpeg, ensuring H.264/AAC for MP4 compatibility
-        app.logger.info(f"⚙️ Task {task_id}: Combining with ffmpeg into {final_output_path_on_disk}")
+        # Streams that already are H.264 / AAC are copied as-is (a remux); only other codecs
+        # (VP9/AV1 video, Opus/Vorbis audio) need a transcode
+        video_is_h264 = bool(video_vcodec) and video_vcodec.startswith("avc1")
+        video_codec_args = ["-c:v", "copy"] if video_is_h264 else _h264_encoder_args()
+        audio_is_aac = bool(audio_acodec) and (audio_acodec == "aac" or audio_acodec.startswith("mp4a"))
+        audio_codec = "copy" if audio_is_aac else "aac"
+        app.logger.info(
+            f"⚙️ Task {task_id}: Combining with ffmpeg into {final_output_path_on_disk} "
+            f"(video: {video_codec_args[1]}, audio: {audio_codec})"
+        )
         ffmpeg_cmd = [
             "ffmpeg",
             "-y",  # Overwrite output files without asking
+            "-loglevel",
+            "error",  # Only errors on stderr (no banner/stream dump or stats lines)
+            "-nostats",
+            "-progress",
+            "pipe:1",  # Machine-readable key=value progress blocks on stdout
             "-i",
             video_path,
             "-i",
             audio_path,
-            "-c:v",
-            "libx264",  # Transcode video to H.264
+            *video_codec_args,  # Copy H.264 video, otherwise transcode to H.264
             "-c:a",
-            "aac",  # Transcode audio to AAC
-            "-strict",
-            "-2",  # For experimental AAC codec if needed (often good practice)
-            "-crf",
-            "23",  # Video quality (Constant Rate Factor, lower is better, 18-28 is typical)
-            "-preset",
-            "fast",  # Encoding speed (ultrafast, superfast, veryfast, faster, fast, medium, slow, slower, veryslow)
-            final_output_path_on_disk,  # Output to UUID.mp4
+            audio_codec,  # Copy AAC audio, otherwise transcode to AAC
+            "-movflags",
+            "+faststart",  # moov atom up front so browsers can start playback before the download finishes
+            "-f",
+            "mp4",
+            part_output_path,  # Output to UUID.mp4.part, renamed on success (-f mp4 sets the format)
         ]
         # app.logger.info(f"Task {task_id}: Executing FFmpeg command: {' '.join(ffmpeg_cmd)}") # Removed for brevity
 
-        # Execute FFmpeg with real-time progress parsing
-        process = subprocess.Popen(
-            ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, bufsize=1
-        )
-
-        # Read stderr line by line for progress updates
-        stderr_output = []
-        try:
-            for line in process.stderr:
-                stderr_output.append(line)
-                # Parse progress if we have duration (will raise exception if cancelled)
-                if video_duration > 0:
-                    _parse_ffmpeg_progress(task_id, line, video_duration)
-
-            # Wait for process to complete
-            process.wait()
-        except Exception:
-            # Task was cancelled - kill FFmpeg process immediately
-            if task_id in cancelled_tasks:
-                app.logger.info(f"🚫 Task {task_id}: Killing FFmpeg process due to cancellation")
-                process.kill()
-                process.wait()  # Wait for process to actually terminate
-                cancelled_tasks.discard(task_id)  # Remove from cancelled set
-                raise  # Re-raise to propagate cancellation
-            else:
-                # Some other error during progress parsing
-                raise
+        # Video transcodes are CPU-bound and share FFMPEG_TRANSCODE_JOBS slots; a stream-copy remux starts right away
+        with _transcode_slot(task_id, cancel_event) if not video_is_h264 else nullcontext():
+            # Execute FFmpeg with real-time progress parsing
+            process = subprocess.Popen(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            _lower_process_priority(process.pid)
+
+            # Drain stderr on a helper thread so FFmpeg can never block on a full pipe, keeping only the tail
+            # for error reporting
+            stderr_output = deque(maxlen=FFMPEG_STDERR_TAIL_LINES)
+            stderr_reader = threading.Thread(target=stderr_output.extend, args=(process.stderr,), daemon=True)
+            stderr_reader.start()
+            progress_fields = {}
+            try:
+                # Each -progress block is a run of key=value lines terminated by progress=continue (or =end)
+                for line in process.stdout:
+                    key, _, value = line.rstrip().partition(b"=")
+                    if key != b"progress":
+                        progress_fields[key] = value
+                        continue
+                    # Will raise exception if cancelled
+                    _parse_ffmpeg_progress(task_id, progress_fields, video_duration, cancel_event)
+
+                # Wait for process to complete
+                process.wait()
+                stderr_reader.join()
+            except Exception:
+                # Task was cancelled - kill FFmpeg process immediately
+                if cancel_event is not None and cancel_event.is_set():
+                    app.logger.info(f"🚫 Task {task_id}: Killing FFmpeg process due to cancellation")
+                    process.kill()
+                    process.wait()  # Wait for process to actually terminate
+                    raise  # Re-raise to propagate cancellation
+                else:
+                    # Some other error during progress parsing
+                    raise
 
         if process.returncode != 0:
-            stderr_text = "".join(stderr_output)
-            stderr_summary = stderr_text[:100]  # Truncate stderr for log
+            stderr_text = b"".join(stderr_output).decode("utf-8", errors="replace")
+            stderr_summary = stderr_text[-4096:]  # Last 4 KiB of stderr for log
             error_message = f"❌ FFmpeg task {task_id} failed. RC: {process.returncode}. Stderr: {stderr_summary}..."
             app.logger.error(error_message)
             raise Exception(error_message)
+        os.replace(part_output_path, final_output_path_on_disk)
 
         total_time = time.time() - start_time
-        file_size_mb = os.path.getsize(final_output_path_on_disk) / (1024 * 1024)
+        # The last -progress block already carries the output size; stat() only if FFmpeg didn't report it
+        total_size = progress_fields.get(b"total_size", b"")
+        file_size_bytes = int(total_size) if total_size.isdigit() else os.path.getsize(final_output_path_on_disk)
+        file_size_mb = file_size_bytes / (1024 * 1024)
         app.logger.info(
             f"Task {task_id}: ✅ Manual FFmpeg combination successful. "
             f"Output: {final_disk_filename}, Size: {file_size_mb:.1f} MB, "
             f"Time: {total_time:.1f}s"
         )
-        return final_disk_filename  # Return the actual filename created
+        return final_disk_filename, file_size_bytes  # Filename created and its size (spares the caller a stat)
 
     except Exception as e:
-        app.logger.error(f"❌ Task {task_id}: Manual FFmpeg combine failed: {e!s}")
-        traceback.print_exc()
+        # Full traceback only in debug mode (the caller logs this failure again with its own context)
+        app.logger.error(f"❌ Task {task_id}: Manual FFmpeg combine failed: {e!s}", exc_info=app.debug)
+        if "part_output_path" in locals():
+            with suppress(FileNotFoundError):
+                os.remove(part_output_path)  # Don't leave a truncated output behind
         raise  # Re-raise to be caught by the calling function in _perform_combination_task
 
 
@@ -806,9 +1381,18 @@ def _manual_combine_for_worker(
 # Note: _perform_combination_task was formerly _perform_actual_combination
 
 
+@lru_cache(maxsize=64)  # Only a handful of codec/container combinations exist across YouTube formats
+def _is_direct_merge_compatible(video_vcodec: str, video_ext: str, audio_acodec: str, audio_ext: str) -> bool:
+    """True if yt-dlp can merge these formats into MP4 without transcoding (H.264 in MP4, AAC in M4A/MP4)"""
+    is_video_compatible = video_vcodec.startswith("avc1") and video_ext == "mp4"
+    is_audio_compatible = (audio_acodec == "aac" or audio_acodec.startswith("mp4a")) and audio_ext in ("m4a", "mp4")
+    return is_video_compatible and is_audio_compatible
+
+
 def _perform_combination_task(task_details):  # Renamed from _perform_actual_combination
     # [Original _perform_combination_task logic starts here...]
     task_id = task_details["task_id"]
+    cancel_event = task_details.get("cancel_event")
     url = task_details["url"]
     video_format_id = task_details["video_format_id"]
     audio_format_id = task_details["audio_format_id"]
@@ -838,7 +1422,6 @@ def _perform_combination_task(task_details):  # Renamed from _perform_actual_com
         "message": f"Combining formats for {clean_title}...",
     }
     task_statuses[task_id] = processing_status
-    COMPLETED_TASKS[task_id] = processing_status
 
     # --- Filename for disk storage (descriptive with uniqueness) ---
     # Create descriptive filename that includes title and quality info
@@ -859,25 +1442,17 @@ def _perform_combination_task(task_details):  # Renamed from _perform_actual_com
     # Attempt 1: yt-dlp direct merge (fastest if codecs are compatible)
     try:
         # Determine if formats are compatible for direct merge (H.264 video, AAC audio, MP4/M4A container)
-        compatible_for_direct_merge = False
-        video_vcodec = video_format_details.get("vcodec", "")
+        # Codecs come from the client's /extract data; fall back to the server-side metadata cache if absent
+        video_vcodec = video_format_details.get("vcodec") or get_cached_format(clean_url, video_format_id).get("vcodec")
+        video_vcodec = video_vcodec or ""
         video_ext = video_format_details.get("ext", "")
-        audio_acodec = audio_format_details.get("acodec", "")
+        audio_acodec = audio_format_details.get("acodec") or get_cached_format(clean_url, audio_format_id).get("acodec")
+        audio_acodec = audio_acodec or ""
         audio_ext = audio_format_details.get("ext", "")
 
-        is_video_compatible = video_vcodec and video_vcodec.startswith("avc1") and video_ext == "mp4"
-        is_audio_compatible = (
-            audio_acodec
-            and (audio_acodec == "aac" or audio_acodec.startswith("mp4a"))
-            and (audio_ext == "m4a" or audio_ext == "mp4")
-        )
-
-        if is_video_compatible and is_audio_compatible:
-            compatible_for_direct_merge = True
+        if _is_direct_merge_compatible(video_vcodec, video_ext, audio_acodec, audio_ext):
             # Signal to frontend immediately so it can show the right progress UI
-            current_status = task_statuses.get(task_id, {})
-            current_status["merge_type"] = "direct"
-            task_statuses[task_id] = current_status
+            task_statuses.update(task_id, {"merge_type": "direct"})
             app.logger.info(
                 f"✅ Task {task_id}: Formats compatible for direct merge. "
                 f"Video: {video_vcodec} ({video_ext}), Audio: {audio_acodec} ({audio_ext})."
@@ -891,41 +1466,26 @@ def _perform_combination_task(task_details):  # Renamed from _perform_actual_com
             )
             raise Exception("Transcoding required, skipping yt-dlp direct merge for progress tracking")
 
-        if compatible_for_direct_merge:
-            ydl_opts_combine = {
-                "format": f"{video_format_id}+{audio_format_id}",
-                "merge_output_format": "mp4",
-                "outtmpl": final_output_path,
-                "verbose": False,
-                "quiet": True,
-                "noprogress": True,
-                "noplaylist": True,
-                "ignoreerrors": False,  # Let it fail to trigger manual fallback if direct merge fails
-                "socket_timeout": 300,
-                "progress_hooks": [lambda d: _update_progress(task_id, d, phase="downloading_combined")],
-                **get_ytdlp_base_opts(),
-            }
-        else:
-            ydl_opts_combine = {
-                "format": f"{video_format_id}+{audio_format_id}",
-                "merge_output_format": "mp4",
-                "outtmpl": final_output_path,  # Disk filename: UUID.mp4
-                "recodevideo": "mp4",
-                "verbose": False,
-                "quiet": True,
-                "noprogress": True,
-                "noplaylist": True,
-                "postprocessor_args": ["-vcodec", "libx264", "-acodec", "aac"],
-                "ignoreerrors": False,  # Let it fail to trigger manual fallback
-                "socket_timeout": 300,
-                "progress_hooks": [lambda d: _update_progress(task_id, d, phase="downloading_combined")],
-                "postprocessor_hooks": [lambda d: _postprocessor_hook(task_id, d)],
-                **get_ytdlp_base_opts(),
-            }
+        # Only compatible formats get here: transcodes always go through the manual combine below
+        ydl_opts_combine = {
+            "format": f"{video_format_id}+{audio_format_id}",
+            "merge_output_format": "mp4",
+            "outtmpl": final_output_path,
+            "verbose": False,
+            "quiet": True,
+            "noprogress": True,
+            "noplaylist": True,
+            "ignoreerrors": False,  # Let it fail to trigger manual fallback if direct merge fails
+            "socket_timeout": 300,
+            "progress_hooks": [lambda d: _update_progress(task_id, d, "downloading_combined", cancel_event)],
+            # yt-dlp's merger already stream-copies (-c copy); also put the moov atom first like the manual combine
+            "postprocessor_args": {"merger+ffmpeg_o": ["-movflags", "+faststart"]},
+            **get_ytdlp_base_opts(),
+        }
         # app.logger.info(f"Task {task_id}: Using yt-dlp opts: {ydl_opts_combine}") # Removed for brevity
 
         with yt_dlp.YoutubeDL(ydl_opts_combine) as ydl:
-            ydl.download([clean_url])
+            download_with_cached_info(ydl, clean_url)
 
         # If download completes without error, this path is taken by 'else' block.
 
@@ -933,7 +1493,6 @@ def _perform_combination_task(task_details):  # Renamed from _perform_actual_com
         # Check if task was cancelled
         if "cancelled by user" in str(e_yt_dlp_combine):
             app.logger.info(f"🚫 Task {task_id}: yt-dlp download cancelled, stopping processing")
-            cancelled_tasks.discard(task_id)  # Clean up cancelled set
             return  # Exit early, status already set to "cancelled"
 
         app.logger.warning(f"⚠️ yt-dlp merge failed for task {task_id}: {e_yt_dlp_combine!s}. Falling back to manual.")
@@ -941,9 +1500,9 @@ def _perform_combination_task(task_details):  # Renamed from _perform_actual_com
         # Attempt 2: Manual download and ffmpeg combination (with transcoding)
         try:
             with tempfile.TemporaryDirectory() as temp_dir:
-                # _manual_combine_for_worker saves as task_id.mp4 and returns task_id (UUID)
-                # This function inherently transcodes to H.264/AAC.
-                returned_base = _manual_combine_for_worker(
+                # _manual_combine_for_worker returns the descriptive filename it saved and that file's size
+                # Output is always H.264/AAC; streams already in those codecs are copied rather than re-encoded.
+                returned_base, final_size = _manual_combine_for_worker(
                     task_id,
                     clean_url,
                     video_format_id,
@@ -952,13 +1511,14 @@ def _perform_combination_task(task_details):  # Renamed from _perform_actual_com
                     video_resolution_text,
                     temp_dir,
                     video_duration,
+                    audio_acodec,
+                    cancel_event,
+                    video_vcodec,
                 )
 
-                # Expected path after manual combine
-                actual_created_filepath = os.path.join(PROCESSED_FILES_DIR, returned_base)
-
-                if returned_base == on_disk_filename and os.path.exists(actual_created_filepath):
-                    app.logger.info(f"✅ Manual combine task {task_id} success. File: {actual_created_filepath}")
+                # The worker writes to the same descriptive filename, so its path is final_output_path
+                if returned_base == on_disk_filename:
+                    app.logger.info(f"✅ Manual combine task {task_id} success. File: {final_output_path}")
                     success_status = {
                         "status": "completed",
                         "on_disk_filename": on_disk_filename,
@@ -966,26 +1526,24 @@ def _perform_combination_task(task_details):  # Renamed from _perform_actual_com
                         "message": "File ready for download (manual combine/transcode).",
                         "completed_at": time.time(),
                     }
+                    register_processed_file(on_disk_filename, final_size)
                     task_statuses[task_id] = success_status
-                    COMPLETED_TASKS[task_id] = success_status
                 else:
                     # This indicates an issue with _manual_combine_for_worker's output or file saving
                     app.logger.error(
                         f"❌ Manual combine task {task_id} error. Worker: '{returned_base}', "
-                        f"Expected: '{actual_created_filepath}' "
-                        f"(Exists: {os.path.exists(actual_created_filepath)})."
+                        f"Expected: '{on_disk_filename}'."
                     )
-                    raise Exception("Manual combine error: Output file not found or worker return mismatch.")
+                    raise Exception("Manual combine error: worker return mismatch.")
 
         except Exception as e_manual_combine:  # Manual ffmpeg combination also failed or cancelled
             # Check if task was cancelled
             if "cancelled by user" in str(e_manual_combine):
                 app.logger.info(f"🚫 Task {task_id}: Manual combine cancelled, stopping processing")
-                cancelled_tasks.discard(task_id)  # Clean up cancelled set
                 return  # Exit early, status already set to "cancelled"
 
-            app.logger.error(f"❌ Manual combine task {task_id} also failed: {e_manual_combine!s}")
-            traceback.print_exc()
+            # Full traceback only in debug mode
+            app.logger.error(f"❌ Manual combine task {task_id} also failed: {e_manual_combine!s}", exc_info=app.debug)
 
             # Provide user-friendly error messages for common issues
             error_str = str(e_manual_combine)
@@ -1002,11 +1560,14 @@ def _perform_combination_task(task_details):  # Renamed from _perform_actual_com
                 "completed_at": time.time(),
             }
             task_statuses[task_id] = failure_status
-            COMPLETED_TASKS[task_id] = failure_status
 
     else:  # yt-dlp direct merge was successful (no exception from the first 'try' block)
         app.logger.info(f"✅ yt-dlp direct merge task {task_id} success. File: {final_output_path}")
-        if not os.path.exists(final_output_path):
+        try:
+            final_size = os.stat(final_output_path).st_size
+        except FileNotFoundError:
+            final_size = None
+        if final_size is None:
             app.logger.error(f"❌ yt-dlp merge task {task_id} success, but file '{final_output_path}' missing!")
             # This should ideally not happen if ydl.download() didn't raise an error.
             # Handling it defensively.
@@ -1016,7 +1577,6 @@ def _perform_combination_task(task_details):  # Renamed from _perform_actual_com
                 "completed_at": time.time(),
             }
             task_statuses[task_id] = failure_status
-            COMPLETED_TASKS[task_id] = failure_status
         else:
             success_status = {
                 "status": "completed",
@@ -1025,12 +1585,13 @@ def _perform_combination_task(task_details):  # Renamed from _perform_actual_com
                 "message": "File ready for download (direct merge).",
                 "completed_at": time.time(),
             }
+            register_processed_file(on_disk_filename, final_size)
             task_statuses[task_id] = success_status
-            COMPLETED_TASKS[task_id] = success_status
 
 
 def _perform_individual_download(task_details):
     task_id = task_details.get("task_id")
+    cancel_event = task_details.get("cancel_event")
     video_url = clean_youtube_url(task_details.get("url"))  # Clean playlist params from URL
     format_id = task_details.get("format_id")
     # 'selected_format' now comes from 'selected_format_details' passed by queue_individual_download_task
@@ -1046,13 +1607,11 @@ def _perform_individual_download(task_details):
                 "message": "Critical task details missing.",
                 "completed_at": time.time(),
             }
-            COMPLETED_TASKS[task_id] = task_statuses[task_id]
         return  # Cannot proceed
 
     app.logger.info(f"📥 Ind. task {task_id} for format {format_id} ('{video_title}') URL: {video_url}")
     # Initialize status
     task_statuses[task_id] = {"status": "processing", "message": "Download initiated."}
-    COMPLETED_TASKS[task_id] = task_statuses[task_id]  # Ensure visibility
 
     files_to_potentially_clean = []
 
@@ -1073,10 +1632,9 @@ def _perform_individual_download(task_details):
         is_mp3_conversion = format_id.startswith("bestaudio_mp3")
 
         # MEMORY d86a8376-601a-403f-a4e7-76e8b4c8916e
-        is_hls_audio_only = selected_format.get("type") == "audio-only" and selected_format.get("protocol") in [
-            "m3u8",
-            "m3u8_native",
-        ]
+        is_hls_audio_only = (
+            selected_format.get("type") == "audio-only" and selected_format.get("protocol") in HLS_PROTOCOLS
+        )
 
         # Determine final file extension
         if is_mp3_conversion:
@@ -1099,20 +1657,15 @@ def _perform_individual_download(task_details):
         on_disk_filepath_final_target = os.path.join(PROCESSED_FILES_DIR, on_disk_filename_final_target)
         files_to_potentially_clean.append(on_disk_filepath_final_target)
 
-        on_disk_filename_pp_double_ext = None
-        on_disk_filepath_pp_double_ext = None
-        if is_hls_audio_only:  # Only relevant for HLS audio transcoding potentially creating .m4a.m4a
-            on_disk_filename_pp_double_ext = f"{on_disk_filename_final_target}.{final_file_ext}"
-            on_disk_filepath_pp_double_ext = os.path.join(PROCESSED_FILES_DIR, on_disk_filename_pp_double_ext)
-            # files_to_potentially_clean.append(on_disk_filepath_pp_double_ext) # Add only if it's created and different
-
         # For MP3 conversion, use "bestaudio" format selector; otherwise use the specified format_id
         ydl_format = "bestaudio" if is_mp3_conversion else format_id
 
-        # For MP3 conversion, use outtmpl WITHOUT extension - postprocessor adds .mp3
-        if is_mp3_conversion:
-            # Strip the .mp3 extension from the output path for yt-dlp
-            outtmpl_path = on_disk_filepath_final_target.rsplit(".mp3", 1)[0]
+        # For MP3 conversion and HLS audio, use outtmpl WITHOUT extension - FFmpegExtractAudio adds .mp3/.m4a
+        # and deletes the extensionless download, so yt-dlp writes the final name itself (no .m4a.m4a to rename)
+        if is_mp3_conversion or is_hls_audio_only:
+            # Strip the .mp3/.m4a extension from the output path for yt-dlp
+            outtmpl_path = on_disk_filepath_final_target.removesuffix(f".{final_file_ext}")
+            files_to_potentially_clean.append(outtmpl_path)  # Only left behind if the conversion fails
         else:
             outtmpl_path = on_disk_filepath_final_target
 
@@ -1125,7 +1678,7 @@ def _perform_individual_download(task_details):
             "overwrites": True,
             "noplaylist": True,
             "socket_timeout": 300,
-            "progress_hooks": [lambda d: _update_progress(task_id, d, phase="downloading")],
+            "progress_hooks": [lambda d: _update_progress(task_id, d, "downloading", cancel_event)],
             **get_ytdlp_base_opts(),
         }
 
@@ -1165,42 +1718,14 @@ def _perform_individual_download(task_details):
         # app.logger.debug(f"Task {task_id}: yt-dlp options: {ydl_opts}") # Removed for brevity
 
         with yt_dlp.YoutubeDL(ydl_opts) as ydl_downloader:
-            ydl_downloader.download([video_url])  # yt-dlp uses the main video URL to fetch the specific format
-
-        # After download, check for the double-extension file if HLS audio was processed
-        if (
-            is_hls_audio_only
-            and on_disk_filepath_pp_double_ext
-            and os.path.exists(on_disk_filepath_pp_double_ext)
-            and on_disk_filepath_pp_double_ext != on_disk_filepath_final_target  # Make sure they are different files
-        ):
-            app.logger.info(f"📝 Task {task_id}: HLS audio created double-ext file: {on_disk_filepath_pp_double_ext}.")
-            # Add the double-extension file to cleanup list as it's an intermediate
-            if on_disk_filepath_pp_double_ext not in files_to_potentially_clean:
-                files_to_potentially_clean.append(on_disk_filepath_pp_double_ext)
-
-            # The original target (e.g., uuid.m4a) might have been deleted by yt-dlp's postprocessor,
-            # or it might be an empty/incomplete file.
-            # We want to rename the double-extension file (e.g., uuid.m4a.m4a) to the desired final name (uuid.m4a).
-            if os.path.exists(on_disk_filepath_final_target):
-                app.logger.warning(
-                    f"⚠️ Task {task_id}: Original target {on_disk_filepath_final_target} exists "
-                    f"with double-ext. Removing."
-                )
-                with suppress(Exception):
-                    os.remove(on_disk_filepath_final_target)
+            download_with_cached_info(ydl_downloader, video_url)
 
-            app.logger.info(f"📝 Task {task_id}: Renaming {on_disk_filepath_pp_double_ext} to target.")
-            os.rename(on_disk_filepath_pp_double_ext, on_disk_filepath_final_target)
-
-        if not os.path.exists(on_disk_filepath_final_target):
+        # One stat() both verifies the product exists and gives its size for the processed-files index
+        try:
+            final_size = os.stat(on_disk_filepath_final_target).st_size
+        except FileNotFoundError:
             app.logger.error(f"❌ Task {task_id}: Download failed. File {on_disk_filepath_final_target} not found.")
-            # Log if double-extension file exists, indicating a rename issue or intended output not handled
-            if on_disk_filepath_pp_double_ext and os.path.exists(on_disk_filepath_pp_double_ext):
-                app.logger.warning(
-                    f"⚠️ Task {task_id}: Double-ext file {on_disk_filepath_pp_double_ext} still exists (rename issue)."
-                )
-            raise RuntimeError("File not found after download process.")
+            raise RuntimeError("File not found after download process.") from None
 
         app.logger.info(
             f"✅ Task {task_id}: Download successful. "
@@ -1208,29 +1733,26 @@ def _perform_individual_download(task_details):
             f"User: {user_facing_filename}"
         )
         # Update status for success
-        current_task_status = task_statuses.get(task_id, {})  # Get existing status
-        current_task_status.update(
+        task_statuses.update(
+            task_id,
             {
                 "status": "completed",
                 "message": "Download successful.",
                 "filename": user_facing_filename,
                 "on_disk_filename": on_disk_filename_final_target,
                 "completed_at": time.time(),
-            }
+            },
         )
-        task_statuses[task_id] = current_task_status  # Assign the fully updated dict
-        COMPLETED_TASKS[task_id] = current_task_status  # Assign the same fully updated dict
+        register_processed_file(on_disk_filename_final_target, final_size)
 
     except Exception as e:
         # Check if task was cancelled
         if "cancelled by user" in str(e):
             app.logger.info(f"🚫 Task {task_id}: Individual download cancelled, stopping processing")
-            cancelled_tasks.discard(task_id)  # Clean up cancelled set
             return  # Exit early, status already set to "cancelled"
 
-        app.logger.error(f"❌ Task {task_id}: Error in _perform_individual_download: {e!s}")
-        if app.debug:  # Print full traceback if in debug mode
-            traceback.print_exc()
+        # Full traceback only in debug mode
+        app.logger.error(f"❌ Task {task_id}: Error in _perform_individual_download: {e!s}", exc_info=app.debug)
 
         # Provide user-friendly error messages for common issues
         error_str = str(e)
@@ -1242,16 +1764,14 @@ def _perform_individual_download(task_details):
             user_message = f"Download failed: {e!s}"
 
         # Update status for failure
-        current_status = task_statuses.get(task_id, {})  # Get current status to preserve any existing fields
-        current_status.update(
+        task_statuses.update(
+            task_id,
             {
                 "status": "failed",
                 "message": user_message,
                 "completed_at": time.time(),
-            }
+            },
         )
-        task_statuses[task_id] = current_status
-        COMPLETED_TASKS[task_id] = task_statuses[task_id]  # Ensure it's in COMPLETED_TASKS
     finally:
         # Cleanup logic
         final_product_on_disk_name = task_statuses.get(task_id, {}).get("on_disk_filename")
@@ -1260,26 +1780,90 @@ def _perform_individual_download(task_details):
             final_product_full_path = os.path.join(PROCESSED_FILES_DIR, final_product_on_disk_name)
 
         unique_files_to_clean = set(files_to_potentially_clean)  # Use set to avoid duplicate cleaning attempts
+        task_completed = task_statuses.get(task_id, {}).get("status") == "completed"
 
         for f_path_to_clean in unique_files_to_clean:
-            if f_path_to_clean and os.path.exists(f_path_to_clean):
-                # Do not delete the final successfully processed file
-                if (
-                    task_statuses.get(task_id, {}).get("status") == "completed"
-                    and f_path_to_clean == final_product_full_path
-                ):
-                    app.logger.info(f"👍 Task {task_id}: Keeping product: {f_path_to_clean}")
-                    continue
-
-                # Otherwise, it's an intermediate, failed, or redundant file, so clean it
-                try:
-                    os.remove(f_path_to_clean)
-                    app.logger.info(f"🗑️ Task {task_id}: Cleaned temp: {f_path_to_clean}")
-                except Exception as e_cleanup:
-                    app.logger.error(f"🔥 Task {task_id}: Error cleaning {f_path_to_clean}: {e_cleanup!s}")
+            if not f_path_to_clean:
+                continue
+            # Do not delete the final successfully processed file
+            if task_completed and f_path_to_clean == final_product_full_path:
+                app.logger.info(f"👍 Task {task_id}: Keeping product: {f_path_to_clean}")
+                continue
+
+            # Otherwise, it's an intermediate, failed, or redundant file, so clean it (no stat() first)
+            try:
+                os.remove(f_path_to_clean)
+                app.logger.info(f"🗑️ Task {task_id}: Cleaned temp: {f_path_to_clean}")
+            except FileNotFoundError:
+                continue  # Never created, or already renamed into place
+            except Exception as e_cleanup:
+                app.logger.error(f"🔥 Task {task_id}: Error cleaning {f_path_to_clean}: {e_cleanup!s}")
         app.logger.info(f"🏁 Ind. task {task_id} ended with status: {task_statuses.get(task_id, {}).get('status')}")
 
 
+def _enqueue_task(task_details: dict) -> bool:
+    """Queue a task with a fresh cancellation Event; returns False if the queue is full"""
+    task_id = task_details["task_id"]
+    task_details["cancel_event"] = task_events[task_id] = threading.Event()
+    try:
+        task_queue.put_nowait(task_details)
+    except queue.Full:
+        task_events.pop(task_id, None)
+        app.logger.warning(f"⏳ Task queue full ({MAX_QUEUE}), rejecting task {task_id}")
+        return False
+    return True
+
+
+def _requester_id() -> str:
+    """Identify the client behind the current request: the page's X-Client-Id header, else its address"""
+    return (request.headers.get("X-Client-Id") or request.remote_addr or "")[:64]
+
+
+def _claim_duplicate_task(dedupe_key: tuple, requester: str) -> str | None:
+    """Return the task_id of an identical queued, processing or completed task (call with _task_dedupe_lock held)
+
+    A queued or processing match records requester as sharing it, so a cancel from another client leaves it
+    running. A repeat from the same client (e.g. a double-click) is not counted twice.
+    """
+    task_id = _task_dedupe_index.get(dedupe_key)
+    if task_id is None:
+        return None
+    status_info = task_statuses.get(task_id, {})
+    status = status_info.get("status")
+    if status in ("queued", "processing"):
+        _task_requesters.setdefault(task_id, set()).add(requester)
+        _task_withdrawn.get(task_id, set()).discard(requester)  # Asking again undoes an earlier cancel
+        return task_id
+    if status == "completed":
+        # Only while its file is still on disk (the size cap may have evicted it early)
+        with _processed_files_lock:
+            if status_info.get("on_disk_filename") in _processed_files_index:
+                return task_id
+    return None  # Failed, cancelled or expired: queue a fresh task
+
+
+def _duplicate_task_response(task_id: str):
+    """202 response pointing a repeated request at the task already handling it"""
+    app.logger.info(f"♻️ Identical request already handled by task {task_id}, reusing it")
+    return (
+        jsonify(
+            {
+                "message": "An identical request is already queued or done; reusing its task.",
+                "task_id": task_id,
+                "status_url": f"/task_status/{task_id}",
+            }
+        ),
+        202,
+    )
+
+
+# Task type -> function that runs it (task_details["type"] is set by the queueing routes)
+TASK_HANDLERS = {
+    "combination": _perform_combination_task,
+    "individual_download": _perform_individual_download,
+}
+
+
 # This function is called by the worker to dispatch tasks
 def _process_task(task_details):
     task_id = task_details.get("task_id", "unknown_task_id")
@@ -1287,36 +1871,44 @@ def _process_task(task_details):
     app.logger.info(f"⚙️ Processing task {task_id} of type {task_type}")
 
     # Check if task has been cancelled
-    if task_id in cancelled_tasks:
+    cancel_event = task_details.get("cancel_event")
+    if cancel_event is not None and cancel_event.is_set():
         app.logger.info(f"🚫 Task {task_id} was cancelled, skipping processing")
-        cancelled_tasks.discard(task_id)  # Remove from cancelled set
         return
 
-    if task_type == "combination":
-        _perform_combination_task(task_details)
-    elif task_type == "individual_download":
-        _perform_individual_download(task_details)  # Assuming this function is defined elsewhere
-    else:
-        app.logger.error(f"❌ Task {task_id}: Unknown task type '{task_type}'. Marking as failed.")
-        failure_status = {
-            "status": "failed",
-            "message": f"Unknown task type: {task_type}",
-            "completed_at": time.time(),
-        }
-        # Ensure task_statuses and COMPLETED_TASKS are accessible here or passed if necessary
-        # For now, assuming they are global as per previous structure
-        task_statuses[task_id] = failure_status
-        COMPLETED_TASKS[task_id] = failure_status
+    try:
+        handler = TASK_HANDLERS.get(task_type)
+        if handler is not None:
+            handler(task_details)
+        else:
+            app.logger.error(f"❌ Task {task_id}: Unknown task type '{task_type}'. Marking as failed.")
+            failure_status = {
+                "status": "failed",
+                "message": f"Unknown task type: {task_type}",
+                "completed_at": time.time(),
+            }
+            task_statuses[task_id] = failure_status
+        # Only finished downloads are worth keeping across a restart; failed/cancelled tasks are simply retried
+        final_status = task_statuses.get(task_id)
+        if final_status and final_status.get("status") == "completed":
+            _persist_completed_task(task_id, final_status)
+    finally:
+        # The worker keeps task_details bound until its next task; drop the bulky yt-dlp format metadata now
+        for key in ("video_format_details", "audio_format_details", "selected_format"):
+            task_details.pop(key, None)
 
 
 def combination_worker_loop():
-    print("🛠️ Combination worker thread started.", flush=True)
+    app.logger.info("🛠️ Combination worker thread started.")
     while True:
         try:
             task_details = task_queue.get()
             task_id = task_details["task_id"]
             app.logger.info(f"👷 Worker picked up task: {task_id} with details: {task_details}")
             _process_task(task_details)
+            task_events.pop(task_id, None)
+            with _task_dedupe_lock:
+                _task_requesters.pop(task_id, None)
             task_queue.task_done()
             app.logger.info(f"✅ Worker finished task: {task_id}")
         except Exception as e:
@@ -1328,15 +1920,17 @@ def combination_worker_loop():
                 exc_info=True,
             )
             if task_id_in_error != "unknown_task":
-                current_status = COMPLETED_TASKS.get(task_id_in_error, {})
+                task_events.pop(task_id_in_error, None)
+                with _task_dedupe_lock:
+                    _task_requesters.pop(task_id_in_error, None)
+                current_status = task_statuses.get(task_id_in_error, {})
                 if current_status.get("status") not in ["completed", "failed"]:
                     failure_status = {
                         "status": "failed",
                         "message": f"Critical worker error: {e!s}",
                         "completed_at": time.time(),
                     }
-                    task_statuses[task_id_in_error] = failure_status  # Update live status
-                    COMPLETED_TASKS[task_id_in_error] = failure_status  # Update persistent record
+                    task_statuses[task_id_in_error] = failure_status
             if "task_details" in locals() and hasattr(task_queue, "task_done"):  # Ensure task_done can be called
                 task_queue.task_done()
 
@@ -1363,6 +1957,12 @@ def combine_video_audio_queued():
         video_format_id = video_format_details.get("format_id")
         audio_format_id = audio_format_details.get("format_id")
 
+        if not all([url, video_format_id, audio_format_id]):
+            return (
+                jsonify({"error": "URL, video_format_id, and audio_format_id required"}),
+                400,
+            )
+
         # Extract other relevant info, preferring details from the format objects
         # Fallback to older direct parameters if needed, though ideally they become redundant
         raw_video_resolution = video_format_details.get("quality") or video_format_details.get("height")
@@ -1373,35 +1973,16 @@ def combine_video_audio_queued():
 
         video_vcodec = video_format_details.get("vcodec") or data.get("videoVcodec")
 
-        # Clean up video_resolution if it's problematic (e.g. 'nullp', 'undefinedp', or just 'p')
-        video_resolution = ""
-        if (
-            raw_video_resolution
-            and isinstance(raw_video_resolution, str)
-            and raw_video_resolution.lower() not in ["nullp", "undefinedp", "p", "unknown"]
-        ):
-            video_resolution = raw_video_resolution.replace(
-                "p", ""
-            )  # Store just the number like '1080' or keep as is if it's already '1080p'
-            if video_resolution.isdigit():  # Ensure it's a number before adding 'p'
-                video_resolution = f"{video_resolution}p"
-            else:  # if it was something else, or became empty after stripping 'p'
-                video_resolution = (
-                    raw_video_resolution if raw_video_resolution.endswith("p") else ""
-                )  # keep original if it ended with p, else empty
-        if not video_resolution:  # final fallback
-            video_resolution = ""  # Use empty string for no resolution
-
-        if not all([url, video_format_id, audio_format_id]):
-            return (
-                jsonify({"error": "URL, video_format_id, and audio_format_id required"}),
-                400,
-            )
+        # Normalize to e.g. '1080p'; problematic values ('nullp', 'undefinedp', 'Nonep', 'p', 'unknown') become ''
+        resolution_match = (
+            _VIDEO_RESOLUTION.fullmatch(raw_video_resolution) if isinstance(raw_video_resolution, str) else None
+        )
+        video_resolution = f"{resolution_match.group(1)}p" if resolution_match else ""
 
-        video_format_id = str(video_format_id).split("-")[0]
-        audio_format_id = str(audio_format_id).split("-")[0]
+        video_format_id = str(video_format_id).partition("-")[0]
+        audio_format_id = str(audio_format_id).partition("-")[0]
 
-        task_id = str(uuid.uuid4())
+        task_id = uuid.uuid4().hex
         task_details = {
             "task_id": task_id,
             "url": url,
@@ -1417,11 +1998,21 @@ def combine_video_audio_queued():
             "type": "combination",  # Specify task type
         }
 
-        task_queue.put(task_details)
-        task_statuses[task_id] = {
-            "status": "queued",
-            "message": "Request accepted and queued for processing.",
-        }
+        requester = _requester_id()
+        dedupe_key = ("combination", clean_youtube_url(url), video_format_id, audio_format_id)
+        with _task_dedupe_lock:
+            existing_task_id = _claim_duplicate_task(dedupe_key, requester)
+            if existing_task_id is None:
+                if not _enqueue_task(task_details):
+                    return jsonify({"error": "Server busy, please retry shortly"}), 503
+                task_statuses[task_id] = {
+                    "status": "queued",
+                    "message": "Request accepted and queued for processing.",
+                }
+                _task_dedupe_index[dedupe_key] = task_id
+                _task_requesters[task_id] = {requester}
+        if existing_task_id is not None:
+            return _duplicate_task_response(existing_task_id)
 
         app.logger.info(f"📨 Task {task_id} (combination) queued for URL: {url}")
 
@@ -1438,9 +2029,8 @@ def combine_video_audio_queued():
         )  # HTTP 202 Accepted
 
     except Exception as e:
-        # print(f"❌ Error queueing combination task: {e!s}", flush=True) # Removed, traceback is kept
-        app.logger.error(f"❌ Error queueing combination task for {url if 'url' in locals() else 'unknown URL'}: {e!s}")
-        traceback.print_exc()
+        url_str = url if "url" in locals() else "unknown URL"
+        app.logger.exception(f"❌ Error queueing combination task for {url_str}: {e!s}")
         return jsonify({"error": f"Error queueing task: {e!s}"}), 500
 
 
@@ -1459,7 +2049,7 @@ def queue_individual_download_task():
                 400,
             )
 
-        task_id = str(uuid.uuid4())
+        task_id = uuid.uuid4().hex
         task_details = {
             "task_id": task_id,
             "type": "individual_download",
@@ -1470,12 +2060,21 @@ def queue_individual_download_task():
             "submitted_at": time.time(),
         }
 
-        task_queue.put(task_details)
-        task_statuses[task_id] = {
-            "status": "queued",
-            "message": "Individual download accepted and queued.",
-        }
-        COMPLETED_TASKS[task_id] = task_statuses[task_id]  # Initialize for polling
+        requester = _requester_id()
+        dedupe_key = ("individual_download", clean_youtube_url(url), format_id)
+        with _task_dedupe_lock:
+            existing_task_id = _claim_duplicate_task(dedupe_key, requester)
+            if existing_task_id is None:
+                if not _enqueue_task(task_details):
+                    return jsonify({"error": "Server busy, please retry shortly"}), 503
+                task_statuses[task_id] = {
+                    "status": "queued",
+                    "message": "Individual download accepted and queued.",
+                }
+                _task_dedupe_index[dedupe_key] = task_id
+                _task_requesters[task_id] = {requester}
+        if existing_task_id is not None:
+            return _duplicate_task_response(existing_task_id)
 
         app.logger.info(f"+ Queued ind. task {task_id} for URL: {url}, fmt: {format_id}")
 
@@ -1494,8 +2093,7 @@ def queue_individual_download_task():
     except Exception as e:
         format_id_str = format_id if "format_id" in locals() else "unknown"
         url_str = url if "url" in locals() else "unknown URL"
-        app.logger.error(f"❌ Error queueing ind. download for {url_str} (fmt: {format_id_str}): {e!s}")
-        traceback.print_exc()
+        app.logger.exception(f"❌ Error queueing ind. download for {url_str} (fmt: {format_id_str}): {e!s}")
         return jsonify({"error": f"Error queueing individual download: {e!s}"}), 500
 
 
@@ -1504,7 +2102,22 @@ def get_task_status(task_id):
     status_info = task_statuses.get(task_id)
     if not status_info:
         return jsonify({"error": "Task ID not found"}), 404
-    return jsonify(status_info), 200
+    withdrawn = _task_withdrawn.get(task_id)
+    if withdrawn and _requester_id() in withdrawn:
+        # This client cancelled; the task itself runs on for the other clients that requested it
+        response = jsonify({"status": "cancelled", "message": "Task cancelled by user"})
+        response.cache_control.no_cache = True
+        return response
+    # Every status change stores a new dict, so an identical object means the cached body is still current
+    cached = _status_json_cache.get(task_id)
+    if cached is None or cached[0] is not status_info:
+        body = app.json.dumps(status_info).encode()
+        cached = _status_json_cache[task_id] = (status_info, body, f"{hash(body) & 0xFFFFFFFFFFFFFFFF:x}")
+    response = app.response_class(cached[1], mimetype=app.json.mimetype)
+    # Revalidate on every poll; an unchanged status then costs a bodiless 304
+    response.set_etag(cached[2])
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 
 @app.route("/cancel_task/<task_id>", methods=["POST"])
@@ -1520,13 +2133,36 @@ def cancel_task(task_id):
     if current_status not in ["queued", "processing"]:
         return jsonify({"error": f"Cannot cancel task with status: {current_status}"}), 400
 
-    # Mark task as cancelled
-    cancelled_tasks.add(task_id)
+    # A deduplicated task shared by several clients keeps running until the last of them cancels
+    requester = _requester_id()
+    with _task_dedupe_lock:
+        requesters = _task_requesters.get(task_id, set())
+        others = len(requesters - {requester})
+        if others:
+            requesters.discard(requester)
+            _task_withdrawn.setdefault(task_id, set()).add(requester)
+    if others:
+        app.logger.info(f"🚫 Task {task_id}: cancelled for one client, still running for {others} other(s)")
+        return (
+            jsonify(
+                {
+                    "success": True,
+                    "still_running": True,
+                    "message": "Task cancelled; it is still running for other requesters",
+                }
+            ),
+            200,
+        )
+
+    # Mark task as cancelled (the worker drops the Event once the task finishes)
+    cancel_event = task_events.get(task_id)
+    if cancel_event is not None:
+        cancel_event.set()
 
     # Update task status
-    status_info.update({"status": "cancelled", "message": "Task cancelled by user", "completed_at": time.time()})
-    task_statuses[task_id] = status_info
-    COMPLETED_TASKS[task_id] = status_info
+    task_statuses.update(
+        task_id, {"status": "cancelled", "message": "Task cancelled by user", "completed_at": time.time()}
+    )
 
     app.logger.info(f"🚫 Task {task_id} cancelled by user")
 
@@ -1542,7 +2178,9 @@ def download_processed_file(task_id):
 
     app.logger.info(f"[DOWNLOAD_PROCESSED] Task {task_id}: Status info: {status_info}")
 
-    if status_info.get("status") == "completed":
+    # status_info is an immutable snapshot (TaskStore swaps in new dicts), so read the status once
+    status = status_info.get("status")
+    if status == "completed":
         on_disk_base_filename = status_info.get("on_disk_filename")
         user_suggested_filename = status_info.get("filename")
 
@@ -1571,29 +2209,37 @@ def download_processed_file(task_id):
             f"User suggested name: '{user_suggested_filename}'"
         )
 
-        if os.path.exists(actual_file_path_on_disk):
-            # Sanitize the user-suggested filename for the download prompt
-            download_name_header = sanitize_for_http_header(user_suggested_filename)
-            app.logger.info(
-                f"[DOWNLOAD_PROCESSED] Task {task_id}: File '{actual_file_path_on_disk}' found. "
-                f"Serving as '{download_name_header}'."
-            )
-            # Override MIME types that Python's mimetypes module gets wrong
-            # (e.g., .m4a → audio/mp4a-latm instead of audio/mp4, which browsers flag as insecure)
-            mime_overrides = {
-                ".m4a": "audio/mp4",
-                ".webm": "audio/webm",
-            }
-            ext = os.path.splitext(actual_file_path_on_disk)[1].lower()
-            mimetype = mime_overrides.get(ext)
-            return send_from_directory(
-                os.path.dirname(actual_file_path_on_disk),
-                os.path.basename(actual_file_path_on_disk),
+        # Sanitize the user-suggested filename for the download prompt
+        download_name_header = sanitize_for_http_header(user_suggested_filename)
+        ext = os.path.splitext(on_disk_base_filename)[1].lower()
+        mimetype = MIME_TYPE_OVERRIDES.get(ext)
+        if X_ACCEL_REDIRECT_PREFIX:
+            # nginx answers 404 itself if the file has since been cleaned up
+            mimetype = mimetype or mimetypes.guess_type(on_disk_base_filename)[0] or "application/octet-stream"
+            response = app.response_class(mimetype=mimetype)
+            response.headers["X-Accel-Redirect"] = f"{X_ACCEL_REDIRECT_PREFIX}/{quote(on_disk_base_filename)}"
+            response.headers.set("Content-Disposition", "attachment", filename=download_name_header)
+            # nginx passes Cache-Control through; it adds ETag/Last-Modified and Range support itself
+            response.cache_control.private = True
+            response.cache_control.max_age = PROCESSED_FILE_MAX_AGE_SECONDS
+            return response
+
+        try:
+            # The path is built from our own on-disk filename, so send_file can take it directly; its single
+            # stat() doubles as the existence check, and conditional/etag give Range and 304 support
+            response = send_file(
+                actual_file_path_on_disk,
                 as_attachment=True,
                 download_name=download_name_header,
                 mimetype=mimetype,
+                conditional=True,
+                etag=True,
+                max_age=PROCESSED_FILE_MAX_AGE_SECONDS,
             )
-        else:
+            # send_file marks a max_age response public; keep it to the requesting browser's cache
+            response.cache_control.public = False
+            response.cache_control.private = True
+        except FileNotFoundError:
             app.logger.error(
                 f"[DOWNLOAD_PROCESSED_ERROR] Task {task_id}: "
                 f"File '{actual_file_path_on_disk}' (from 'filepath' key) not found on disk, "
@@ -1603,17 +2249,22 @@ def download_processed_file(task_id):
                 jsonify({"error": "File not found on server (filepath invalid), though task marked completed."}),
                 404,
             )
+        app.logger.info(
+            f"[DOWNLOAD_PROCESSED] Task {task_id}: File '{actual_file_path_on_disk}' found. "
+            f"Serving as '{download_name_header}'."
+        )
+        return response
 
-    elif status_info.get("status") == "failed":
+    elif status == "failed":
         app.logger.info(f"[DOWNLOAD_PROCESSED] Task {task_id}: Task failed. Message: {status_info.get('message')}")
         return (
             jsonify({"error": f"Task failed: {status_info.get('message', 'Unknown error')}"}),
             500,
         )
-    elif status_info.get("status") == "processing":
+    elif status == "processing":
         app.logger.info(f"[DOWNLOAD_PROCESSED] Task {task_id}: Task still processing.")
         return jsonify({"error": "Task is still processing."}), 202
-    elif status_info.get("status") == "queued":
+    elif status == "queued":
         app.logger.info(f"[DOWNLOAD_PROCESSED] Task {task_id}: Task is queued.")
         return jsonify({"error": "Task is queued."}), 202
     else:
@@ -1623,58 +2274,68 @@ def download_processed_file(task_id):
         return jsonify({"error": "Task not completed or file not available."}), 404
 
 
-@app.route("/favicon.ico")
-def favicon():
-    return send_from_directory(".", "favicon.ico")
+@lru_cache(maxsize=1)
+def _favicon_bytes() -> bytes:
+    """Read favicon.ico once; it ships with the app and never changes while running"""
+    with open(os.path.join(app.root_path, "favicon.ico"), "rb") as f:
+        return f.read()
 
 
-# Start the background worker thread
-# Ensure processed_files_dir exists when module loads
-if not os.path.exists(PROCESSED_FILES_DIR):
-    print(f"Creating processed files directory: {PROCESSED_FILES_DIR}", flush=True)
-    os.makedirs(PROCESSED_FILES_DIR)
-
-print("Initializing and starting background task worker...", flush=True)
-worker_thread = threading.Thread(target=combination_worker_loop, daemon=True)
-worker_thread.start()
-print("Background task worker started.", flush=True)
+@app.route("/favicon.ico")
+def favicon():
+    try:
+        body = _favicon_bytes()
+    except FileNotFoundError:
+        return "", 404
+    response = app.response_class(body, mimetype="image/vnd.microsoft.icon")
+    response.headers["Cache-Control"] = "public, max-age=86400"
+    return response
+
+
+use_dev_server = __name__ == "__main__" and os.environ.get("USE_DEV_SERVER", "true").lower() == "true"
+# With debug=True the dev server's reloader re-imports this module in a child process (WERKZEUG_RUN_MAIN=true)
+# that serves requests; the watching parent must not start its own workers and cleanup scheduler
+_is_reloader_parent = use_dev_server and os.environ.get("WERKZEUG_RUN_MAIN") != "true"
+
+# Bring back completed tasks from before a restart so their download links still resolve
+if not _is_reloader_parent:
+    _load_persisted_tasks()
+
+# Start the background worker threads (PROCESSED_FILES_DIR was created at import, above)
+worker_threads = []
+if not _is_reloader_parent:
+    app.logger.info(f"Initializing and starting {DL_WORKERS} background task worker(s)...")
+    worker_threads = [
+        threading.Thread(target=combination_worker_loop, daemon=True, name=f"task-worker-{i}")
+        for i in range(DL_WORKERS)
+    ]
+    for worker_thread in worker_threads:
+        worker_thread.start()
+    app.logger.info("Background task workers started.")
 
 # Record application start time for health checks
 app.start_time = time.time()
 
 # Start the cleanup scheduler
-print("Starting automatic file cleanup scheduler...", flush=True)
-schedule_cleanup()
-print("File cleanup scheduler started.", flush=True)
+if not _is_reloader_parent:
+    app.logger.info("Starting automatic file cleanup scheduler...")
+    schedule_cleanup()
+    app.logger.info("File cleanup scheduler started.")
 
 if __name__ == "__main__":
-    use_dev_server = os.environ.get("USE_DEV_SERVER", "true").lower() == "true"
     flask_port_info = int(os.environ.get("APP_PORT", 8080))
 
     if use_dev_server:
-        print(
-            f"🚀 Starting Flask development server on http://0.0.0.0:{flask_port_info}",
-            flush=True,
-        )
+        app.logger.info(f"🚀 Starting Flask development server on http://0.0.0.0:{flask_port_info}")
         # debug=True enables auto-reloader and debugger. Flask's reloader handles threads better.
         # threaded=True is generally good for dev server to handle multiple requests like polling.
         app.run(host="0.0.0.0", port=flask_port_info, debug=True, threaded=True)
     else:
         # When using Gunicorn, it will run the 'app' object directly.
         # The host and port will be configured via Gunicorn's command line arguments.
-        print(
-            "Application ready to be served by Gunicorn (or another WSGI server).",
-            flush=True,
-        )
-        print(
-            "To ensure the in-memory queue and worker thread function correctly with Gunicorn,",
-            flush=True,
-        )
-        print(
-            "it's recommended to run Gunicorn with a single worker process (--workers 1).",
-            flush=True,
-        )
-        print(
-            "Example: gunicorn --workers 1 --threads 4 --bind 0.0.0.0:8080 server:app",
-            flush=True,
+        app.logger.info("Application ready to be served by Gunicorn (or another WSGI server).")
+        app.logger.info("To ensure the in-memory queue and worker thread function correctly with Gunicorn,")
+        app.logger.info("it's recommended to run Gunicorn with a single worker process (--workers 1).")
+        app.logger.info(
+            "Example: gunicorn --worker-class gthread --workers 1 --threads 4 --bind 0.0.0.0:8080 server:app"
         )
@@ -9,7 +9,9 @@ if [ "${USE_DEV_SERVER}" = "true" ]; then
 else
   echo "Starting Gunicorn server..."
   # Execute Gunicorn with command-line arguments, using environment variables for configuration
+  # gthread workers serve concurrent requests on threads; keep a single worker so the in-memory queue is shared
   gunicorn \
+    --worker-class gthread \
     --workers ${GUNICORN_WORKERS:-1} \
     --threads ${GUNICORN_THREADS:-4} \
     --bind 0.0.0.0:${APP_PORT:-8080} \
@@ -5,6 +5,9 @@ const results = document.getElementById("results");
 const videoInfo = document.getElementById("videoInfo");
 const formatList = document.getElementById("formatList");
 const clearInputIcon = document.getElementById("clearInputIcon");
+// Identifies this page to the server, so a cancel only withdraws this page's share of a deduplicated task
+const CLIENT_ID =
+  Date.now().toString(36) + Math.random().toString(36).slice(2);
 
 function isValidYouTubeUrl(url) {
   const regex =
@@ -242,6 +245,7 @@ async function combineVideoAudio(
       method: "POST",
       headers: {
         "Content-Type": "application/json",
+        "X-Client-Id": CLIENT_ID,
       },
       body: JSON.stringify({
         url: currentUrl,
@@ -493,6 +497,7 @@ function attachCancelHandler(
         `/cancel_task/${buttonElement.currentTaskId}`,
         {
           method: "POST",
+          headers: { "X-Client-Id": CLIENT_ID },
         }
       );
 
@@ -574,7 +579,9 @@ function pollTaskStatus(
     }
 
     try {
-      const response = await fetch(statusUrl);
+      const response = await fetch(statusUrl, {
+        headers: { "X-Client-Id": CLIENT_ID },
+      });
       if (!response.ok) {
         // If status endpoint itself fails, stop polling for this task
         console.error("Error fetching task status:", response.status);
@@ -680,42 +687,33 @@ function pollTaskStatus(
               videoFill.style.width = percent + "%";
               audioPhase.style.display = "none";
               combiningPhase.style.display = "none";
-            } else if (phase.includes("downloading_video")) {
-              const percent = data.progress_percent || 0;
+            } else if (
+              phase.includes("downloading_video") ||
+              phase.includes("downloading_audio")
+            ) {
+              // Video and audio download in parallel, each with its own percentage
               videoPhase.style.display = "";
               audioPhase.style.display = "";
               combiningPhase.style.display = "";
               videoPhase.querySelector(".phase-label").textContent = "Video:";
-              videoPhase.querySelector(".phase-icon").textContent = "⏳";
-              videoPhase.querySelector(".phase-status").textContent = `${
-                data.progress_percent
-                  ? data.progress_percent.toFixed(0) + "%"
-                  : "In progress..."
-              }`;
-              videoProgress.style.display = "block";
-              videoFill.style.width = percent + "%";
-              audioPhase.querySelector(".phase-icon").textContent = "⏳";
-              audioPhase.querySelector(".phase-status").textContent =
-                "Waiting...";
-              audioProgress.style.display = "none";
-              combiningPhase.querySelector(".phase-icon").textContent = "⏳";
-              combiningPhase.querySelector(".phase-status").textContent =
-                "Waiting...";
-              combiningProgress.style.display = "none";
-            } else if (phase.includes("downloading_audio")) {
-              const percent = data.progress_percent || 0;
-              videoPhase.querySelector(".phase-icon").textContent = "✓";
-              videoPhase.querySelector(".phase-status").textContent =
-                "Downloaded";
-              videoProgress.style.display = "none";
-              audioPhase.querySelector(".phase-icon").textContent = "⏳";
-              audioPhase.querySelector(".phase-status").textContent = `${
-                data.progress_percent
-                  ? data.progress_percent.toFixed(0) + "%"
-                  : "In progress..."
-              }`;
-              audioProgress.style.display = "block";
-              audioFill.style.width = percent + "%";
+              const streams = [
+                [videoPhase, videoProgress, videoFill, data.video_progress_percent],
+                [audioPhase, audioProgress, audioFill, data.audio_progress_percent],
+              ];
+              for (const [streamPhase, streamProgress, streamFill, percent] of streams) {
+                if (percent >= 100) {
+                  streamPhase.querySelector(".phase-icon").textContent = "✓";
+                  streamPhase.querySelector(".phase-status").textContent =
+                    "Downloaded";
+                  streamProgress.style.display = "none";
+                } else {
+                  streamPhase.querySelector(".phase-icon").textContent = "⏳";
+                  streamPhase.querySelector(".phase-status").textContent =
+                    percent ? percent.toFixed(0) + "%" : "In progress...";
+                  streamProgress.style.display = "block";
+                  streamFill.style.width = (percent || 0) + "%";
+                }
+              }
               combiningPhase.querySelector(".phase-icon").textContent = "⏳";
               combiningPhase.querySelector(".phase-status").textContent =
                 "Waiting...";
@@ -732,11 +730,14 @@ function pollTaskStatus(
               combiningPhase.querySelector(".phase-icon").textContent = "⏳";
               combiningProgress.style.display = "block";
               combiningFill.style.width = (data.progress_percent || 0) + "%";
-              combiningPhase.querySelector(".phase-status").textContent = `${
-                data.progress_percent
-                  ? data.progress_percent.toFixed(0) + "%"
-                  : "0%"
-              }`;
+              combiningPhase.querySelector(".phase-status").textContent =
+                data.waiting_for_encoder
+                  ? "Waiting for encoder..."
+                  : `${
+                      data.progress_percent
+                        ? data.progress_percent.toFixed(0) + "%"
+                        : "0%"
+                    }`;
             }
 
             // Attach cancel handler during processing
@@ -1058,6 +1059,7 @@ async function queueIndividualDownload(format, buttonElement, sectionType) {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
+        "X-Client-Id": CLIENT_ID,
       },
       body: JSON.stringify({
         url: currentUrl,
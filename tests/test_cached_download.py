@@ -0,0 +1,75 @@
+"""Downloads that reuse cached /extract metadata must fetch the format their YoutubeDL asks for"""
+
+import os
+import tempfile
+
+import pytest
+import yt_dlp
+
+# server.py creates processed_files/ in the working directory on import; keep it out of the checkout
+os.chdir(tempfile.mkdtemp(prefix="youtube-downloader-tests-"))
+
+import server  # noqa: E402
+
+VIDEO_URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+
+def _fake_extractor_result():
+    """Minimal extractor output: one video-only and one audio-only format, like a YouTube DASH listing"""
+    return {
+        "id": "abcdefghijk",
+        "title": "Test video",
+        "extractor": "youtube",
+        "extractor_key": "Youtube",
+        "webpage_url": VIDEO_URL,
+        "duration": 10,
+        "formats": [
+            {
+                "format_id": "140",
+                "url": "https://example.invalid/audio.m4a",
+                "ext": "m4a",
+                "protocol": "https",
+                "vcodec": "none",
+                "acodec": "mp4a.40.2",
+                "abr": 128,
+            },
+            {
+                "format_id": "137",
+                "url": "https://example.invalid/video.mp4",
+                "ext": "mp4",
+                "protocol": "https",
+                "vcodec": "avc1.640028",
+                "acodec": "none",
+                "width": 1920,
+                "height": 1080,
+            },
+        ],
+    }
+
+
+@pytest.fixture
+def cached_video(monkeypatch):
+    """Fill the metadata cache for VIDEO_URL the way /extract does, without touching the network"""
+
+    def fake_extract_info(self, url, download=True, **kwargs):
+        # Run the fake result through yt-dlp's own processing, so the default bestvideo+bestaudio selection is made
+        return self.process_ie_result(_fake_extractor_result(), download=download)
+
+    monkeypatch.setattr(yt_dlp.YoutubeDL, "extract_info", fake_extract_info)
+    server._extract_cache.clear()
+    server.extract_info_cached(VIDEO_URL)
+    yield
+    server._extract_cache.clear()
+
+
+def test_cached_download_fetches_only_the_requested_format(cached_video):
+    processed = []
+    with yt_dlp.YoutubeDL({"quiet": True, "format": "140"}) as ydl:
+        # process_info is where yt-dlp starts the actual download; record what it was asked to fetch instead.
+        # Copy the dict: yt-dlp strips keys it shares with the parent info once process_info returns
+        ydl.process_info = lambda info_dict: processed.append(dict(info_dict))
+        server.download_with_cached_info(ydl, VIDEO_URL)
+
+    assert len(processed) == 1
+    assert processed[0]["format_id"] == "140"
+    assert "requested_formats" not in processed[0]  # A merge of the extraction-time selection would carry this
@@ -0,0 +1,61 @@
+"""Identical requests share one task, and a cancel only stops it once no other client still wants it"""
+
+import os
+import tempfile
+
+import pytest
+
+# server.py creates processed_files/ in the working directory on import; keep it out of the checkout
+os.chdir(tempfile.mkdtemp(prefix="youtube-downloader-tests-"))
+
+import server  # noqa: E402
+
+REQUEST_BODY = {
+    "url": "https://www.youtube.com/watch?v=abcdefghijk",
+    "format_id": "140",
+    "selected_format_details": {"format_id": "140"},
+    "video_title": "Test video",
+}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Test client whose queued tasks stay queued (no worker picks them up)"""
+    monkeypatch.setattr(server, "_enqueue_task", lambda task_details: True)
+    server._task_dedupe_index.clear()
+    return server.app.test_client()
+
+
+def _queue(client, client_id):
+    response = client.post("/queue_individual_download", json=REQUEST_BODY, headers={"X-Client-Id": client_id})
+    return response.get_json()["task_id"]
+
+
+def _cancel(client, task_id, client_id):
+    return client.post(f"/cancel_task/{task_id}", headers={"X-Client-Id": client_id}).get_json()
+
+
+def _status(client, task_id, client_id):
+    return client.get(f"/task_status/{task_id}", headers={"X-Client-Id": client_id}).get_json()["status"]
+
+
+def test_double_click_does_not_block_cancel(client):
+    task_id = _queue(client, "page-a")
+    assert _queue(client, "page-a") == task_id
+
+    assert "still_running" not in _cancel(client, task_id, "page-a")
+    assert server.task_statuses[task_id]["status"] == "cancelled"
+
+
+def test_cancel_of_shared_task_only_withdraws_the_caller(client):
+    task_id = _queue(client, "page-a")
+    assert _queue(client, "page-b") == task_id
+
+    # Repeated cancels from one client must not use up the other client's claim
+    assert _cancel(client, task_id, "page-a")["still_running"] is True
+    assert _cancel(client, task_id, "page-a")["still_running"] is True
+    assert _status(client, task_id, "page-a") == "cancelled"
+    assert _status(client, task_id, "page-b") == "queued"
+
+    assert "still_running" not in _cancel(client, task_id, "page-b")
+    assert server.task_statuses[task_id]["status"] == "cancelled"